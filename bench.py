@@ -0,0 +1,445 @@
+"""
+Benchmark suite for the physics engines in this repo.
+
+Runs scripted scenarios headlessly for a fixed number of steps on each engine (main.py, onlyBasicBlock.py and
+test.py) and reports steps per second, per-step latency percentiles and peak memory. Results can be written to
+JSON and compared against a stored baseline to catch regressions:
+
+    python bench.py --output baseline.json
+    python bench.py --baseline baseline.json
+"""
+import os
+
+# The older engines open a window in Game(), give them a dummy one
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import gc
+import importlib.util
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import pygame as pg
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Unsupported(Exception):
+    """
+    Raised when an engine lacks something a scenario needs, e.g. Fancy_Blocks in onlyBasicBlock.py.
+    """
+
+
+class Engine:
+    """
+    Adapter giving the engines a common interface. Every engine is loaded from its file under its own module name,
+    test.py would otherwise clash with the standard library's test package.
+    """
+    def __init__(self, name, filename):
+        self.name = name
+        self.filename = filename
+        self.module = None
+        self.next_player_no = 0
+
+    def load(self):
+        if self.module is None:
+            sys.path.insert(0, HERE)
+            spec = importlib.util.spec_from_file_location(f"bench_engine_{self.name}", os.path.join(HERE, self.filename))
+            self.module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self.module)
+        return self.module
+
+    def new_game(self):
+        """
+        Returns a game without any blocks.
+        """
+        raise NotImplementedError
+
+    def player_no(self):
+        self.next_player_no += 1
+        return self.next_player_no
+
+    def add_block(self, game, x, y, width, height):
+        block = self.load().Block(x, y, width, height, game, game.elasticity, self.player_no())
+        game.players.append(block)
+        return block
+
+    def add_fancy_block(self, game, x, y, width, height):
+        module = self.load()
+        if not hasattr(module, "Fancy_Block"):
+            raise Unsupported(f"{self.filename} has no Fancy_Block")
+        fancy_block = module.Fancy_Block(x, y, width, height, game, game.elasticity, self.player_no())
+        game.fancy_players.append(fancy_block)
+        return fancy_block
+
+    def add_cloth(self, game, x, y, columns, rows, spacing):
+        if not hasattr(game, "meshes"):
+            raise Unsupported(f"{self.filename} has no mass-spring meshes")
+        from softbody import MassSpringMesh
+        cloth = MassSpringMesh.cloth(x, y, columns, rows, spacing)
+        game.meshes.append(cloth)
+        return cloth
+
+    def step(self, game):
+        raise NotImplementedError
+
+    def after_grab(self, game):
+        pass
+
+
+class MainEngine(Engine):
+    """
+    main.py, run headless with its fixed timestep.
+    """
+    def new_game(self):
+        game = self.load().Game(headless=True)
+        game.players.clear()
+        game.fancy_players.clear()
+        game.meshes.clear()
+        return game
+
+    def step(self, game):
+        game.step()
+
+    def after_grab(self, game):
+        # Nothing draws the queued rope line headless
+        game.overlays.clear()
+
+
+class LegacyEngine(Engine):
+    """
+    onlyBasicBlock.py and test.py, stepped the way their run() loop does minus drawing the blocks.
+    """
+    def new_game(self):
+        game = self.load().Game()
+        game.players = []
+        game.fancy_players = []
+        return game
+
+    def step(self, game):
+        if game.move_up:
+            for player in game.players:
+                player.y -= 0.01
+            game.move_up = False
+        for player in game.players:
+            player.update()
+        # test.py runs the Fancy_Block constraints from draw()
+        for fancy_block in game.fancy_players:
+            fancy_block.draw(game.screen)
+
+
+ENGINES = {
+    "main": MainEngine("main", "main.py"),
+    "onlyBasicBlock": LegacyEngine("onlyBasicBlock", "onlyBasicBlock.py"),
+    "test": LegacyEngine("test", "test.py"),
+}
+
+
+class ScriptedMouse:
+    """
+    Replaces the mouse while a scenario runs, so grab() sees a held left button at a scripted position.
+    """
+    def __init__(self, game):
+        self.game = game
+        self.position = (0, 0)
+
+    def __enter__(self):
+        self.get_pressed = pg.mouse.get_pressed
+        pg.mouse.get_pressed = lambda num_buttons=3: (True, False, False)
+        self.game.get_mouse_pos = lambda: self.position
+        return self
+
+    def __exit__(self, *exc_info):
+        pg.mouse.get_pressed = self.get_pressed
+        del self.game.get_mouse_pos
+
+
+class Scenario:
+    """
+    Sets up a game and runs one step of it. Subclasses fill the game in setup().
+    """
+    name = None
+    description = None
+
+    def __init__(self, engine, seed):
+        self.engine = engine
+        self.random = random.Random(seed)
+        self.game = engine.new_game()
+        self.setup()
+        self.bodies = len(self.game.players) + sum(len(mesh) for mesh in getattr(self.game, "meshes", ()))
+
+    def setup(self):
+        raise NotImplementedError
+
+    def step(self, n):
+        self.engine.step(self.game)
+
+    def close(self):
+        pass
+
+
+class FallingPile(Scenario):
+    name = "pile"
+    description = "150 blocks of 20-40 px dropped from random heights"
+
+    def setup(self):
+        # Blocks are placed where they do not overlap any block placed before them, so all overlap during the run
+        # comes from the engine, see sweep.max_penetration
+        placed = []
+        while len(placed) < 150:
+            size = self.random.uniform(20, 40)
+            x, y = self.random.uniform(0, self.game.winwidth - size), self.random.uniform(0, 400)
+            if all(x >= x1 + size1 or x + size <= x1 or y >= y1 + size1 or y + size <= y1 for x1, y1, size1 in placed):
+                placed.append((x, y, size))
+                self.engine.add_block(self.game, x, y, size, size)
+
+
+class FancyGrid(Scenario):
+    name = "fancy_grid"
+    description = "4 by 5 grid of 40 px Fancy_Blocks"
+
+    def setup(self):
+        for row in range(4):
+            for column in range(5):
+                self.engine.add_fancy_block(self.game, 300 + column * 120 + row * 10, 50 + row * 100, 40, 40)
+
+
+class MixedStacks(Scenario):
+    name = "mixed"
+    description = "6 stacks of 8 blocks with a Fancy_Block dropped on every other stack"
+
+    def setup(self):
+        winheight = self.game.winheight
+        for column in range(6):
+            x = 150 + column * 150
+            for level in range(8):
+                self.engine.add_block(self.game, x, winheight - (level + 1) * 40, 40, 40)
+        for column in range(0, 6, 2):
+            self.engine.add_fancy_block(self.game, 145 + column * 150, 100, 50, 30)
+
+
+class RestingDrop(Scenario):
+    name = "drop"
+    description = "Lone 50 px blocks dropped from 4 heights, far enough apart to never touch"
+
+    def setup(self):
+        for column, y in enumerate((500, 600, 620, 640)):
+            self.engine.add_block(self.game, 200 + column * 200, y, 50, 50)
+
+
+class ClothDrape(Scenario):
+    name = "cloth"
+    description = "60 by 40 particle cloth pinned at the top, draped over 3 stacks of blocks"
+
+    def setup(self):
+        winheight = self.game.winheight
+        for column in range(3):
+            for level in range(4):
+                self.engine.add_block(self.game, 350 + column * 200, winheight - (level + 1) * 40, 40, 40)
+        self.engine.add_cloth(self.game, 300, 100, 60, 40, 8)
+
+
+class GrabbedRope(Scenario):
+    name = "rope"
+    description = "Block dragged on the mouse rope in circles through a pile of 60 blocks"
+
+    def setup(self):
+        winwidth, winheight = self.game.winwidth, self.game.winheight
+        for idx in range(60):
+            self.engine.add_block(self.game, 100 + (idx % 30) * 34, winheight - 30 - (idx // 30) * 30, 30, 30)
+        self.center = (winwidth / 2, winheight - 250)
+        self.radius = 250
+        self.grabbed = self.engine.add_block(self.game, self.center[0] + self.radius - 25, self.center[1] - 25, 50, 50)
+        self.grabbed.line = False
+        self.mouse = ScriptedMouse(self.game).__enter__()
+
+    def step(self, n):
+        angle = n / 240 * 2 * math.pi  # One lap every 4 s of game time
+        self.mouse.position = (self.center[0] + self.radius * math.cos(angle), self.center[1] + self.radius * math.sin(angle))
+        self.engine.step(self.game)
+        self.grabbed.grab()
+        self.engine.after_grab(self.game)
+
+    def close(self):
+        self.mouse.__exit__()
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (FallingPile, FancyGrid, MixedStacks, RestingDrop, ClothDrape, GrabbedRope)}
+
+
+def run_scenario(engine, scenario_class, steps, warmup, seed, measure_memory=True):
+    """
+    Runs warmup + steps steps of a scenario on an engine and returns its result dict.
+    Memory is measured in a second run under tracemalloc, which would otherwise skew the timings.
+    """
+    result = {"engine": engine.name, "scenario": scenario_class.name, "steps": steps}
+    try:
+        gc.collect()
+        scenario = scenario_class(engine, seed)
+        result["bodies"] = scenario.bodies
+        try:
+            for n in range(warmup):
+                scenario.step(n)
+            durations = np.zeros(steps)
+            for n in range(steps):
+                start = time.perf_counter()
+                scenario.step(warmup + n)
+                durations[n] = time.perf_counter() - start
+        finally:
+            scenario.close()
+
+        result["steps_per_second"] = steps / durations.sum()
+        result["latency_ms"] = {
+            "mean": durations.mean() * 1000,
+            "p50": np.percentile(durations, 50) * 1000,
+            "p90": np.percentile(durations, 90) * 1000,
+            "p99": np.percentile(durations, 99) * 1000,
+            "max": durations.max() * 1000,
+        }
+
+        if measure_memory:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                scenario = scenario_class(engine, seed)
+                try:
+                    for n in range(warmup + steps):
+                        scenario.step(n)
+                finally:
+                    scenario.close()
+                result["peak_memory_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+            finally:
+                tracemalloc.stop()
+        result["status"] = "ok"
+    except Unsupported as error:
+        result["status"] = "skipped"
+        result["error"] = str(error)
+    except Exception as error:
+        result["status"] = "error"
+        result["error"] = f"{type(error).__name__}: {error}"
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results against a baseline, matched on engine and scenario. Returns the rows of the comparison and
+    whether any run got more than `tolerance` slower in steps per second.
+    """
+    old_results = {(old["engine"], old["scenario"]): old for old in baseline["results"] if old["status"] == "ok"}
+    rows = []
+    regressed = False
+    for result in results:
+        old = old_results.get((result["engine"], result["scenario"]))
+        if old is None or result["status"] != "ok":
+            continue
+        ratio = result["steps_per_second"] / old["steps_per_second"]
+        regression = ratio < 1 - tolerance
+        regressed |= regression
+        rows.append({
+            "engine": result["engine"],
+            "scenario": result["scenario"],
+            "ratio": ratio,
+            "p99_change": result["latency_ms"]["p99"] / old["latency_ms"]["p99"] - 1,
+            "regression": regression,
+        })
+    return rows, regressed
+
+
+def print_results(results):
+    table = Table(title="Benchmark")
+    for column in ("engine", "scenario", "bodies", "steps/s", "p50 ms", "p90 ms", "p99 ms", "max ms", "peak KiB"):
+        if column in ("engine", "scenario"):
+            table.add_column(column, no_wrap=True)
+        else:
+            table.add_column(column, justify="right")
+    for result in results:
+        if result["status"] != "ok":
+            table.add_row(result["engine"], result["scenario"], str(result.get("bodies", "")), f"[yellow]{result['status']}[/yellow]")
+            continue
+        latency = result["latency_ms"]
+        memory = result.get("peak_memory_kb")
+        table.add_row(
+            result["engine"], result["scenario"], str(result["bodies"]), f"{result['steps_per_second']:.1f}",
+            f"{latency['p50']:.3f}", f"{latency['p90']:.3f}", f"{latency['p99']:.3f}", f"{latency['max']:.3f}",
+            "" if memory is None else f"{memory:.0f}",
+        )
+    console.print(table)
+    for result in results:
+        if result["status"] != "ok":
+            console.print(f"{result['engine']} {result['scenario']} {result['status']}: {result['error']}")
+
+
+def print_comparison(rows, tolerance):
+    table = Table(title=f"Compared to baseline (tolerance {tolerance:.0%})")
+    for column in ("engine", "scenario", "steps/s", "p99 latency", ""):
+        table.add_column(column)
+    for row in rows:
+        table.add_row(
+            row["engine"], row["scenario"], f"{row['ratio'] - 1:+.1%}", f"{row['p99_change']:+.1%}",
+            "[red]REGRESSION[/red]" if row["regression"] else "[green]ok[/green]",
+        )
+    console.print(table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the physics engines on scripted scenarios.")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--steps", type=int, default=600, help="Timed steps per run")
+    parser.add_argument("--warmup", type=int, default=30, help="Untimed steps before the timed ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run measuring peak memory")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    results = []
+    for engine_name in args.engines:
+        for scenario_name in args.scenarios:
+            console.print(f"Running {scenario_name} on {engine_name}...")
+            results.append(run_scenario(ENGINES[engine_name], SCENARIOS[scenario_name], args.steps, args.warmup, args.seed, not args.no_memory))
+    print_results(results)
+
+    report = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pygame": pg.version.ver,
+            "platform": platform.platform(),
+            "steps": args.steps,
+            "warmup": args.warmup,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        console.print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        rows, regressed = compare(results, baseline, args.tolerance)
+        print_comparison(rows, args.tolerance)
+        if regressed:
+            console.print("[bold red]Performance regressed against the baseline[/bold red]")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
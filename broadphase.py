@@ -0,0 +1,362 @@
+import math
+import numpy as np
+
+
+class SweepAndPrune:
+    """
+    Persistent sort-and-sweep broadphase on the x axis for Fancy_Blocks.
+    The endpoint list is kept between steps. Bodies only move a little per step, so the list is nearly sorted
+    and an insertion sort brings it back in order in close to linear time.
+    """
+    def __init__(self):
+        self.endpoints = []  # [x, is_max, body], sorted by x with min endpoints before max endpoints on ties
+        self.body_endpoints = {}  # body -> (min endpoint, max endpoint)
+
+    def sync(self, bodies):
+        """
+        Adds endpoints for new bodies and drops the endpoints of bodies that are no longer in the list.
+        """
+        present = set(bodies)
+        if len(present) != len(self.body_endpoints) or any(body not in self.body_endpoints for body in present):
+            self.endpoints = [endpoint for endpoint in self.endpoints if endpoint[2] in present]
+            for body in list(self.body_endpoints):
+                if body not in present:
+                    del self.body_endpoints[body]
+            for body in bodies:
+                if body not in self.body_endpoints:
+                    lower = [0.0, 0, body]
+                    upper = [0.0, 1, body]
+                    self.endpoints.append(lower)
+                    self.endpoints.append(upper)
+                    self.body_endpoints[body] = (lower, upper)
+
+    def sort(self):
+        """
+        Insertion sort of the endpoint list, cheap when the list is already nearly sorted.
+        """
+        endpoints = self.endpoints
+        for i in range(1, len(endpoints)):
+            endpoint = endpoints[i]
+            key = (endpoint[0], endpoint[1])
+            j = i - 1
+            while j >= 0 and (endpoints[j][0], endpoints[j][1]) > key:
+                endpoints[j + 1] = endpoints[j]
+                j -= 1
+            endpoints[j + 1] = endpoint
+
+    def update(self, bodies):
+        """
+        Refreshes the endpoints from the bodies' current bounds and returns every pair whose bounding boxes overlap.
+        Each pair is returned exactly once.
+        """
+        self.sync(bodies)
+        bounds = {}
+        for body, (lower, upper) in self.body_endpoints.items():
+            box = body.get_bounds()
+            bounds[body] = box
+            lower[0] = box[0]
+            upper[0] = box[2]
+        self.sort()
+
+        pairs = []
+        active = []
+        for x, is_max, body in self.endpoints:
+            if is_max:
+                active.remove(body)
+                continue
+            min_y, max_y = bounds[body][1], bounds[body][3]
+            for other in active:
+                other_box = bounds[other]
+                if min_y <= other_box[3] and other_box[1] <= max_y:
+                    pairs.append((other, body))
+            active.append(body)
+        return pairs
+
+
+def grid_pairs(min_x, min_y, max_x, max_y, cell_size, active=None):
+    """
+    Vectorized uniform grid broadphase over arrays of bounding boxes.
+    Returns two index arrays (i, j) with i < j holding every pair of boxes that share a grid cell, each pair once.
+    With an active mask only pairs with at least one active box are generated, inactive boxes are never paired
+    with each other.
+    """
+    count = len(min_x)
+    if count < 2:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    # One entry per (box, cell) the box touches
+    cx0 = np.floor(min_x / cell_size).astype(np.int64)
+    cy0 = np.floor(min_y / cell_size).astype(np.int64)
+    cells_x = np.floor(max_x / cell_size).astype(np.int64) - cx0 + 1
+    cells_y = np.floor(max_y / cell_size).astype(np.int64) - cy0 + 1
+    per_box = cells_x * cells_y
+    box = np.repeat(np.arange(count), per_box)
+    local = np.arange(len(box)) - np.repeat(np.cumsum(per_box) - per_box, per_box)
+    cx = cx0[box] + local % cells_x[box]
+    cy = cy0[box] + local // cells_x[box]
+    key = (cx - cx.min()) * (cy.max() - cy.min() + 1) + (cy - cy.min())
+
+    # Group the entries by cell
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    box = box[order]
+    position = np.arange(len(key))
+    cell_ends = np.append(np.flatnonzero(np.diff(key)) + 1, len(key))
+    cell_end = cell_ends[np.searchsorted(cell_ends, position, side="right")]
+
+    if active is None:
+        # Pair every entry with the entries after it in the same cell
+        partners = cell_end - position - 1
+        first = np.repeat(position, partners)
+        second = first + 1 + np.arange(len(first)) - np.repeat(np.cumsum(partners) - partners, partners)
+    else:
+        # Pair every active entry with every other entry in the same cell
+        cell_start = np.append(0, cell_ends[:-1])[np.searchsorted(cell_ends, position, side="right")]
+        position = position[active[box]]
+        partners = cell_end[position] - cell_start[position]
+        first = np.repeat(position, partners)
+        second = np.repeat(cell_start[position], partners) + np.arange(len(first)) - np.repeat(np.cumsum(partners) - partners, partners)
+        different = first != second
+        first, second = first[different], second[different]
+
+    # Boxes sharing several cells show up once per shared cell
+    a, b = box[first], box[second]
+    pair_keys = np.minimum(a, b) * count + np.maximum(a, b)
+    pair_keys.sort()
+    pair_keys = pair_keys[np.append(True, pair_keys[1:] != pair_keys[:-1])[:len(pair_keys)]]
+    return pair_keys // count, pair_keys % count
+
+
+class GridIndex:
+    """
+    Uniform grid over a fixed set of boxes, for spatial queries: point, region, k-nearest and raycast.
+    Built in one vectorized pass as (cell key, box) entries sorted by key, so the boxes of a cell are found with a
+    binary search and a query only looks at the cells it touches. Box numbers are positions in the arrays it was
+    built from, e.g. World rows. update moves the boxes afterwards without building it again.
+    """
+    def __init__(self, min_x, min_y, max_x, max_y, cell_size=50):
+        self.min_x, self.min_y = np.array(min_x, dtype=np.float64), np.array(min_y, dtype=np.float64)
+        self.max_x, self.max_y = np.array(max_x, dtype=np.float64), np.array(max_y, dtype=np.float64)
+        self.center_x = (self.min_x + self.max_x) / 2
+        self.center_y = (self.min_y + self.max_y) / 2
+        self.cell_size = cell_size
+        count = len(self.min_x)
+
+        cx0, cy0 = self.cell(self.min_x, self.min_y)
+        cx1, cy1 = self.cell(self.max_x, self.max_y)
+        keys, box = self.entries(np.arange(count), cx0, cy0, cx1, cy1)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.boxes = box[order]
+        # Range of cells holding anything, searches stop once they leave it
+        if count:
+            self.bounds = (int(cx0.min()), int(cy0.min()), int(cx1.max()), int(cy1.max()))
+        else:
+            self.bounds = (0, 0, -1, -1)
+
+    def entries(self, boxes, cx0, cy0, cx1, cy1):
+        """
+        Returns the (cell key, box) entries of boxes covering the cells from (cx0, cy0) to (cx1, cy1), unsorted.
+        """
+        cells_x, cells_y = cx1 - cx0 + 1, cy1 - cy0 + 1
+        per_box = cells_x * cells_y
+        position = np.repeat(np.arange(len(boxes)), per_box)
+        local = np.arange(len(position)) - np.repeat(np.cumsum(per_box) - per_box, per_box)
+        keys = self.key(cx0[position] + local % cells_x[position], cy0[position] + local // cells_x[position])
+        return keys, boxes[position]
+
+    def update(self, min_x, min_y, max_x, max_y):
+        """
+        Moves the boxes to new bounds, given for every box like to the constructor. Only boxes that now cover other
+        cells get their entries replaced, so after blocks moved a little this costs a comparison of the bounds and
+        little more, instead of sorting every entry again.
+        """
+        changed = np.flatnonzero(
+            (self.min_x != min_x) | (self.min_y != min_y) | (self.max_x != max_x) | (self.max_y != max_y)
+        )
+        if not len(changed):
+            return
+        old_cx0, old_cy0 = self.cell(self.min_x[changed], self.min_y[changed])
+        old_cx1, old_cy1 = self.cell(self.max_x[changed], self.max_y[changed])
+        for column, values in ((self.min_x, min_x), (self.min_y, min_y), (self.max_x, max_x), (self.max_y, max_y)):
+            column[changed] = np.asarray(values)[changed]
+        self.center_x[changed] = (self.min_x[changed] + self.max_x[changed]) / 2
+        self.center_y[changed] = (self.min_y[changed] + self.max_y[changed]) / 2
+
+        cx0, cy0 = self.cell(self.min_x[changed], self.min_y[changed])
+        cx1, cy1 = self.cell(self.max_x[changed], self.max_y[changed])
+        recelled = (cx0 != old_cx0) | (cy0 != old_cy0) | (cx1 != old_cx1) | (cy1 != old_cy1)
+        if not recelled.any():
+            return
+        moved = np.zeros(len(self), dtype=bool)
+        moved[changed[recelled]] = True
+        keep = ~moved[self.boxes]
+        keys, box = self.entries(changed[recelled], cx0[recelled], cy0[recelled], cx1[recelled], cy1[recelled])
+        order = np.argsort(keys, kind="stable")
+        keys, box = keys[order], box[order]
+        # The new entries go in where they belong among the ones kept, which stay sorted
+        positions = np.searchsorted(self.keys[keep], keys, side="right")
+        self.keys = np.insert(self.keys[keep], positions, keys)
+        self.boxes = np.insert(self.boxes[keep], positions, box)
+        # The range of cells in use only grows, searches through cells that emptied out find nothing there
+        x0, y0, x1, y1 = self.bounds
+        self.bounds = (
+            min(x0, int(cx0.min())), min(y0, int(cy0.min())), max(x1, int(cx1.max())), max(y1, int(cy1.max())),
+        )
+
+    def __len__(self):
+        return len(self.min_x)
+
+    def cell(self, x, y):
+        return np.floor(np.asarray(x) / self.cell_size).astype(np.int64), np.floor(np.asarray(y) / self.cell_size).astype(np.int64)
+
+    @staticmethod
+    def key(cx, cy):
+        # Cell coordinates stay far below 2**30 for any sane cell size, so the key fits in 64 bits
+        return (np.asarray(cx, dtype=np.int64) << 31) + cy
+
+    def cell_boxes(self, cx, cy):
+        """
+        Returns the boxes in the given cells, given as arrays of cell coordinates, each box once.
+        """
+        keys = self.key(cx, cy)
+        starts = np.searchsorted(self.keys, keys, side="left")
+        counts = np.searchsorted(self.keys, keys, side="right") - starts
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return np.unique(self.boxes[positions])
+
+    def cells_in(self, x0, y0, x1, y1):
+        """
+        Cell coordinates of every cell between the cells (x0, y0) and (x1, y1), clipped to the cells in use.
+        """
+        x0, y0 = max(x0, self.bounds[0]), max(y0, self.bounds[1])
+        x1, y1 = min(x1, self.bounds[2]), min(y1, self.bounds[3])
+        if x0 > x1 or y0 > y1:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        cy, cx = np.mgrid[y0:y1 + 1, x0:x1 + 1]
+        return cx.ravel(), cy.ravel()
+
+    def point(self, x, y):
+        """
+        Returns the boxes containing the point.
+        """
+        cx, cy = self.cell(x, y)
+        boxes = self.cell_boxes(np.array([cx]), np.array([cy]))
+        inside = (self.min_x[boxes] < x) & (x < self.max_x[boxes]) & (self.min_y[boxes] < y) & (y < self.max_y[boxes])
+        return boxes[inside]
+
+    def region(self, x0, y0, x1, y1):
+        """
+        Returns the boxes overlapping the region from (x0, y0) to (x1, y1).
+        """
+        (cx0, cx1), (cy0, cy1) = self.cell([x0, x1], [y0, y1])
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.keys):
+            # A region covering more cells than there are entries is cheaper to test box by box
+            boxes = np.arange(len(self))
+        else:
+            boxes = self.cell_boxes(*self.cells_in(cx0, cy0, cx1, cy1))
+        overlapping = (self.min_x[boxes] <= x1) & (x0 <= self.max_x[boxes]) & (self.min_y[boxes] <= y1) & (y0 <= self.max_y[boxes])
+        return boxes[overlapping]
+
+    def nearest(self, x, y, k=1, max_distance=np.inf):
+        """
+        Returns up to k boxes whose centers are closest to the point, closest first, and their distances.
+        Searches rings of cells outwards from the point's cell. A box is stored in every cell it covers, the cell
+        of its center among them, so after ring r every box whose center is less than r cell sizes from the point
+        has been seen.
+        """
+        cx, cy = (int(c) for c in self.cell(x, y))
+        x0, y0, x1, y1 = self.bounds
+        max_ring = max(abs(cx - x0), abs(cx - x1), abs(cy - y0), abs(cy - y1)) if len(self) else -1
+        found = np.zeros(0, dtype=np.int64)
+        distances = np.zeros(0)
+        for ring in range(max_ring + 1):
+            if ring == 0:
+                ring_x, ring_y = np.array([cx]), np.array([cy])
+            else:
+                side = np.arange(-ring, ring + 1)
+                inner = side[1:-1]
+                ring_x = cx + np.concatenate((side, side, np.full(len(inner), -ring), np.full(len(inner), ring)))
+                ring_y = cy + np.concatenate((np.full(len(side), -ring), np.full(len(side), ring), inner, inner))
+            boxes = np.setdiff1d(self.cell_boxes(ring_x, ring_y), found)
+            found = np.concatenate((found, boxes))
+            distances = np.concatenate((distances, np.hypot(self.center_x[boxes] - x, self.center_y[boxes] - y)))
+            reach = ring * self.cell_size  # Every box closer than this has been seen
+            if reach >= max_distance or len(distances) >= k and np.partition(distances, k - 1)[k - 1] <= reach:
+                break
+        order = np.argsort(distances, kind="stable")[:k]
+        order = order[distances[order] <= max_distance]
+        return found[order], distances[order]
+
+    def raycast(self, x, y, dx, dy, max_distance=np.inf):
+        """
+        Returns the first box hit by the ray from (x, y) in direction (dx, dy) and the distance to the hit, or
+        (None, inf). Walks the cells along the ray in order (Amanatides and Woo) and stops at the first cell
+        holding a hit closer than the cell's far edge.
+        """
+        length = math.hypot(dx, dy)
+        if length == 0 or not len(self):
+            return None, np.inf
+        dx, dy = dx / length, dy / length
+        size = self.cell_size
+
+        # Start where the ray enters the cells in use
+        x0, y0, x1, y1 = self.bounds
+        grid_hit, start = self.slab(x, y, dx, dy, np.array([x0 * size]), np.array([y0 * size]), np.array([(x1 + 1) * size]), np.array([(y1 + 1) * size]))
+        if not grid_hit[0] or start[0] > max_distance:
+            return None, np.inf
+        t = start[0]
+        # The entry point lies on the edge of the cells in use, rounding may put it in the cell outside
+        cx, cy = (int(c) for c in self.cell(x + dx * t, y + dy * t))
+        cx, cy = min(max(cx, x0), x1), min(max(cy, y0), y1)
+        step_x, step_y = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+        next_x = ((cx + (dx > 0)) * size - x) / dx if dx else np.inf
+        next_y = ((cy + (dy > 0)) * size - y) / dy if dy else np.inf
+        delta_x, delta_y = (size / abs(dx) if dx else np.inf), (size / abs(dy) if dy else np.inf)
+
+        best_box, best_distance = None, np.inf
+        tested = np.zeros(0, dtype=np.int64)
+        while x0 <= cx <= x1 and y0 <= cy <= y1 and t <= max_distance:
+            boxes = np.setdiff1d(self.cell_boxes(np.array([cx]), np.array([cy])), tested)
+            tested = np.concatenate((tested, boxes))
+            if len(boxes):
+                hit, distance = self.slab(x, y, dx, dy, self.min_x[boxes], self.min_y[boxes], self.max_x[boxes], self.max_y[boxes])
+                distance = np.where(hit, distance, np.inf)
+                best = int(np.argmin(distance))
+                if distance[best] < best_distance:
+                    best_box, best_distance = int(boxes[best]), float(distance[best])
+            # A hit beyond this cell may still be beaten by a box in a later cell
+            t = min(next_x, next_y)
+            if best_distance <= t:
+                break
+            if next_x < next_y:
+                cx += step_x
+                next_x += delta_x
+            else:
+                cy += step_y
+                next_y += delta_y
+        if best_distance > max_distance:
+            return None, np.inf
+        return best_box, best_distance
+
+    @staticmethod
+    def slab(x, y, dx, dy, min_x, min_y, max_x, max_y):
+        """
+        Slab test of a ray with a unit direction against boxes. Returns whether each box is hit at a distance of
+        at least 0 and the distance where the ray enters it, 0 for boxes the ray starts in.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tx0, tx1 = (min_x - x) / dx, (max_x - x) / dx
+            ty0, ty1 = (min_y - y) / dy, (max_y - y) / dy
+        # A ray parallel to an axis hits along it only when it starts between the box's sides
+        if dx == 0:
+            inside = (min_x <= x) & (x <= max_x)
+            tx0, tx1 = np.where(inside, -np.inf, np.inf), np.full(len(inside), np.inf)
+        if dy == 0:
+            inside = (min_y <= y) & (y <= max_y)
+            ty0, ty1 = np.where(inside, -np.inf, np.inf), np.full(len(inside), np.inf)
+        enter = np.maximum(np.minimum(tx0, tx1), np.minimum(ty0, ty1))
+        leave = np.minimum(np.maximum(tx0, tx1), np.maximum(ty0, ty1))
+        return (enter <= leave) & (leave >= 0), np.maximum(enter, 0)
@@ -0,0 +1,122 @@
+import numpy as np
+from contacts import independent_batches
+
+
+def constraint_batches(a, b, count):
+    """
+    Splits constraints between the points a and b, indices below count, into batches that share no point.
+    """
+    return independent_batches(a, b, count, np.arange(len(a)))
+
+
+def relax(x, y, vx, vy, a, b, rest_length, batches, iterations, stiffness, inverse_mass=None):
+    """
+    Relaxes the distance constraints between the points a and b in `iterations` rounds, one batch at a time so
+    every batch sees the positions the batches before it left (Gauss-Seidel). Each round moves both ends so
+    together they reach the rest length, split by inverse_mass (evenly without it, not at all for two ends with
+    zero inverse mass), and changes their velocities by stiffness times their correction (damping effect).
+    """
+    if inverse_mass is None:
+        share_a = share_b = [np.full(len(batch), 0.5) for batch in batches]
+    else:
+        total = [inverse_mass[a[batch]] + inverse_mass[b[batch]] for batch in batches]
+        share_a = [np.divide(inverse_mass[a[batch]], t, out=np.zeros(len(t)), where=t > 0) for batch, t in zip(batches, total)]
+        share_b = [np.divide(inverse_mass[b[batch]], t, out=np.zeros(len(t)), where=t > 0) for batch, t in zip(batches, total)]
+    for _ in range(iterations):
+        for batch, batch_share_a, batch_share_b in zip(batches, share_a, share_b):
+            batch_a, batch_b = a[batch], b[batch]
+            dx = x[batch_b] - x[batch_a]
+            dy = y[batch_b] - y[batch_a]
+            distance = np.hypot(dx, dy)
+            # Ends on top of each other have no direction to be pushed in
+            apart = distance > 0
+            error = np.where(apart, (distance - rest_length[batch]) / np.where(apart, distance, 1), 0)
+            correction_x = error * dx
+            correction_y = error * dy
+            x[batch_a] += correction_x * batch_share_a
+            y[batch_a] += correction_y * batch_share_a
+            x[batch_b] -= correction_x * batch_share_b
+            y[batch_b] -= correction_y * batch_share_b
+            vx[batch_a] += correction_x * batch_share_a * stiffness
+            vy[batch_a] += correction_y * batch_share_a * stiffness
+            vx[batch_b] -= correction_x * batch_share_b * stiffness
+            vy[batch_b] -= correction_y * batch_share_b * stiffness
+
+
+class DistanceConstraints:
+    """
+    Array-backed graph of distance constraints between World rows, e.g. the edges and diagonals that keep a
+    Fancy_Block square. Constraints refer to rows by body id, so they survive rows moving when other rows are
+    freed, and their rest lengths are computed once when they are added.
+    solve() relaxes every constraint at once in `iterations` rounds. Constraints are split into batches that share
+    no row, each batch is one array operation and sees the positions the batches before it left (Gauss-Seidel).
+    """
+    def __init__(self, iterations=1):
+        self.iterations = iterations
+        self.body_a = np.zeros(0, dtype=np.int64)
+        self.body_b = np.zeros(0, dtype=np.int64)
+        self.rest_length = np.zeros(0)
+        self.batches = None  # Recomputed after constraints are added or removed
+        self.row_cache = None  # (world, world.version, rows of body_a, rows of body_b), see rows()
+
+    def __len__(self):
+        return len(self.rest_length)
+
+    def add(self, body_a, body_b, rest_length):
+        """
+        Adds a constraint keeping each pair of bodies, given by body id, rest_length apart.
+        """
+        self.body_a = np.append(self.body_a, body_a)
+        self.body_b = np.append(self.body_b, body_b)
+        self.rest_length = np.append(self.rest_length, rest_length)
+        self.batches = None
+        self.row_cache = None
+
+    def remove_bodies(self, body_ids):
+        """
+        Removes every constraint of the given bodies.
+        """
+        keep = ~np.isin(self.body_a, body_ids) & ~np.isin(self.body_b, body_ids)
+        self.body_a = self.body_a[keep]
+        self.body_b = self.body_b[keep]
+        self.rest_length = self.rest_length[keep]
+        self.batches = None
+        self.row_cache = None
+
+    def rows(self, world):
+        """
+        Returns the current World rows of both ends of every constraint, -1 for bodies not in the world.
+        Rows only move when rows are allocated or freed, so they are looked up again only after that or after
+        constraints are added or removed.
+        """
+        cache = self.row_cache
+        if cache is not None and cache[0] is world and cache[1] == world.version:
+            return cache[2], cache[3]
+        n = world.count
+        if n == 0:
+            rows = [np.full(len(self), -1), np.full(len(self), -1)]
+        else:
+            order = np.argsort(world.body_id[:n])
+            ids = world.body_id[:n][order]
+            rows = []
+            for body in (self.body_a, self.body_b):
+                idx = np.minimum(np.searchsorted(ids, body), n - 1)
+                rows.append(np.where(ids[idx] == body, order[idx], -1))
+        self.row_cache = (world, world.version, *rows)
+        return rows
+
+    def solve(self, world, stiffness):
+        """
+        Moves both ends of every constraint by half its error per round, so together they reach its rest length,
+        and changes their velocities by stiffness times their correction (damping effect).
+        """
+        if not len(self):
+            return
+        if self.batches is None:
+            bodies, ends = np.unique(np.concatenate((self.body_a, self.body_b)), return_inverse=True)
+            self.batches = constraint_batches(ends[:len(self)], ends[len(self):], len(bodies))
+
+        a, b = self.rows(world)
+        in_world = (a >= 0) & (b >= 0)
+        batches = [batch[in_world[batch]] for batch in self.batches]
+        relax(world.x, world.y, world.vx, world.vy, a, b, self.rest_length, batches, self.iterations, stiffness)
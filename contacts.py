@@ -0,0 +1,581 @@
+from statistics import median
+import numpy as np
+from broadphase import grid_pairs
+
+
+class ContactCache:
+    """
+    Contacts of the last resolve calls keyed by body pair, with the side they were resolved on and the impulse
+    that was applied. Kept as arrays sorted by key so a whole batch of pairs is looked up with one searchsorted.
+    Entries that were not seen for more than max_age calls are dropped.
+    """
+    def __init__(self, max_age=2):
+        self.max_age = max_age
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.side = np.zeros(0, dtype=np.int64)
+        self.impulse = np.zeros(0)
+        self.age = np.zeros(0, dtype=np.int64)
+        self.seen = np.zeros(0, dtype=bool)  # Entries found by the last lookup, store() replaces them
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, keys):
+        """
+        Returns whether each key is cached and its cached side and impulse, zero where it is not.
+        """
+        self.seen = np.zeros(len(self.keys), dtype=bool)
+        if not len(self.keys):
+            return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys))
+        idx = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[idx] == keys
+        self.seen[idx[found]] = True
+        return found, np.where(found, self.side[idx], 0), np.where(found, self.impulse[idx], 0)
+
+    def store(self, keys, side, impulse):
+        """
+        Stores the contacts of this call, each key once and looked up with lookup() first, and ages the entries
+        the lookup did not find.
+        """
+        kept = ~self.seen & (self.age < self.max_age)
+        keys = np.concatenate((keys, self.keys[kept]))
+        order = np.argsort(keys)
+        self.keys = keys[order]
+        self.side = np.concatenate((side, self.side[kept]))[order]
+        self.impulse = np.concatenate((impulse, self.impulse[kept]))[order]
+        self.age = np.concatenate((np.zeros(len(side), dtype=np.int64), self.age[kept] + 1))[order]
+        self.seen = np.zeros(len(self.keys), dtype=bool)
+
+    def clear(self):
+        self.__init__(self.max_age)
+
+    def restore(self, keys, side, impulse, age):
+        """
+        Replaces the cache with the given entries, e.g. loaded from a snapshot, each key once.
+        """
+        order = np.argsort(keys)
+        self.keys = np.asarray(keys, dtype=np.int64)[order]
+        self.side = np.asarray(side, dtype=np.int64)[order]
+        self.impulse = np.asarray(impulse, dtype=np.float64)[order]
+        self.age = np.asarray(age, dtype=np.int64)[order]
+        self.seen = np.zeros(len(self.keys), dtype=bool)
+
+
+# Body ids of the floor and walls in contact keys, real body ids start at 1
+FLOOR, LEFT_WALL, RIGHT_WALL = -1, -2, -3
+
+
+def pair_keys(body_id, i, j):
+    """
+    Returns a key for each pair of rows that does not depend on the order of the pair or on where the rows are,
+    and whether i is the body with the lower id, the one the cached side is seen from.
+    """
+    i_first = body_id[i] < body_id[j]
+    low = np.where(i_first, body_id[i], body_id[j])
+    high = np.where(i_first, body_id[j], body_id[i])
+    return (low << 32) | high, i_first
+
+
+def apply_impulses(vx, vy, a, b, vertical, impulse, inverse_mass):
+    """
+    Applies the impulse of each contact along its normal, pushing a back and b forward.
+    """
+    change = np.concatenate((-impulse * inverse_mass[a], impulse * inverse_mass[b]))
+    rows = np.concatenate((a, b))
+    vertical = np.concatenate((vertical, vertical))
+    vy += np.bincount(rows, np.where(vertical, change, 0), len(vy))
+    vx += np.bincount(rows, np.where(vertical, 0, change), len(vx))
+
+
+def time_of_impact(x, y, width, height, move_x, move_y, i, j):
+    """
+    Swept AABB test of each pair of rows (i, j), the boxes moving by (move_x, move_y) over the step.
+    Returns the fraction of the step after which the boxes first touch, inf for pairs that do not touch within the
+    step and 0 for pairs that overlap from the start, and the axis they touch on, 0 vertical and 1 horizontal.
+    """
+    entry = np.empty((2, len(i)))
+    leave = np.empty((2, len(i)))
+    for axis, (position, size, move) in enumerate(((y, height, move_y), (x, width, move_x))):
+        relative = move[i] - move[j]
+        towards = relative > 0
+        # Distance i has to move relative to j before the boxes touch on this axis, and before they are past each other
+        near = np.where(towards, position[j] - position[i] - size[i], position[i] - position[j] - size[j])
+        far = np.where(towards, position[j] + size[j] - position[i], position[i] + size[i] - position[j])
+        distance = np.abs(relative)
+        overlapping = (position[i] < position[j] + size[j]) & (position[i] + size[i] > position[j])
+        moving = distance > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            entry[axis] = np.where(moving, near / distance, np.where(overlapping, -np.inf, np.inf))
+            leave[axis] = np.where(moving, far / distance, np.where(overlapping, np.inf, -np.inf))
+    # The boxes touch once they overlap on both axes, until they are past each other on either
+    first, last = entry.max(axis=0), leave.min(axis=0)
+    toi = np.where((first <= last) & (first <= 1) & (last >= 0), np.maximum(first, 0), np.inf)
+    return toi, entry.argmax(axis=0)
+
+
+def independent_batches(a, b, static, order):
+    """
+    Splits contacts into batches in which no block other than the static row appears twice, so every batch can
+    be solved at once with plain index assignment. Batches are filled greedily in the given order: a contact joins
+    the batch when it comes first among the remaining contacts of both its blocks, until no contact can join.
+    Returns a list of contact index arrays.
+    """
+    batches = []
+    remaining = order
+    batched = np.zeros(len(a), dtype=bool)
+    while len(remaining):
+        used = np.zeros(static + 1, dtype=bool)
+        candidates = remaining
+        while len(candidates):
+            position = np.arange(len(candidates))
+            first = np.full(static + 1, len(candidates))
+            np.minimum.at(first, a[candidates], position)
+            np.minimum.at(first, b[candidates], position)
+            first[static] = len(candidates)  # The static row never moves, any number of contacts may share it
+            free = candidates[(first[a[candidates]] >= position) & (first[b[candidates]] >= position)]
+            batched[free] = True
+            used[a[free]] = True
+            used[b[free]] = True
+            used[static] = False
+            candidates = candidates[~used[a[candidates]] & ~used[b[candidates]]]
+        batches.append(remaining[batched[remaining]])
+        remaining = remaining[~batched[remaining]]
+    return batches
+
+
+class ContactPipeline:
+    """
+    Batched contact solver for Blocks over the World arrays, replacing check_for_collision_with_block,
+    get_closest_side, energy_transfer and fix_overlap for every row at once.
+    Candidate pairs come from a vectorized grid. Blocks closer than contact_margin pixels, or close enough to reach
+    each other within the step, count as touching, as do blocks touching the floor or walls. Every contact gets a
+    side and a normal impulse, solved with `iterations` rounds of sequential impulses. Contacts are split into
+    batches that share no block and each batch is solved at once, in order from the bottom of a pile up:
+    - contacts approaching faster than rest_speed bounce with the pair's elasticity, slower ones come to rest
+    - the accumulated impulse of a contact only ever pushes
+    - overlap deeper than slop pixels is pushed out by a baumgarte fraction per step, moving the blocks apart in a
+      second solve over positions so pushing out adds no velocity (Baumgarte stabilization with split impulses)
+    Contacts are remembered between steps in a ContactCache: a contact that persists keeps the side it was first
+    resolved on while that side stays within side_hysteresis pixels of the best one, and starts from warm_start
+    times the impulse it needed last time (warm starting).
+    Contacts of rows moving further than ccd_distance pixels in a step that are not touching yet go through
+    continuous collision detection, see sweep_contacts, so fast blocks and long steps neither tunnel through thin
+    blocks nor bounce off blocks that are only passed by.
+    Rows the solver sends somewhere their contacts were not looked for are looked up again, up to late_passes
+    times, and their new contacts solved with the rest.
+    """
+    def __init__(self, cell_size=50, min_cell_size=16, contact_margin=0.5, warm_start=1.0,
+                 iterations=8, baumgarte=0.5, slop=0.2, rest_speed=1.0, side_hysteresis=1.0, ccd_distance=10.0,
+                 late_passes=3):
+        self.cell_size = cell_size
+        self.min_cell_size = min_cell_size
+        self.contact_margin = contact_margin
+        self.warm_start = warm_start
+        self.iterations = iterations
+        self.baumgarte = baumgarte
+        self.slop = slop
+        self.rest_speed = rest_speed
+        self.side_hysteresis = side_hysteresis
+        self.ccd_distance = ccd_distance
+        self.late_passes = late_passes
+        self.cache = ContactCache()
+        # Counts of the last resolve, which Game.update_world adds to the counters of the physics step in its
+        # profiler, shown by the F3 overlay and written by F4
+        self.pairs_tested = 0  # Pairs of swept boxes the grid found in the same cells
+        self.contacts_found = 0  # Of those, pairs touching or about to
+        self.contacts_persisted = 0  # Contacts, floor and walls included, that were in the ContactCache
+        self.contacts_swept = 0  # Contacts that went through continuous collision detection
+        self.contacts_occluded = 0  # Swept contacts dropped behind an earlier impact
+        self.contacts_late = 0  # Contacts found after the solve changed velocities
+
+    def update_cell_size(self, world):
+        """
+        Uses the typical block size as grid cell size, so a typical block covers one or two cells.
+        """
+        n = world.count
+        sizes = np.maximum(world.width[:n], world.height[:n])
+        sizes = sizes[(world.width[:n] > 0) & (world.height[:n] > 0)]
+        if len(sizes):
+            self.cell_size = max(self.min_cell_size, float(median(sizes.tolist())))
+
+    def find_contacts(self, world, active=None, steps=0, vx=None, vy=None):
+        """
+        Returns index arrays (i, j) of every pair of touching rows that may collide, each pair once.
+        Rows touch when they overlap on one axis and overlap, or are less than contact_margin apart, on the other.
+        With steps each box is also swept by its velocity over a step that long, so blocks about to hit each
+        other are found before they overlap (speculative contacts).
+        With an active mask only pairs where at least one of the rows is active are returned.
+        vx and vy sweep the boxes by other velocities than the world's, e.g. the ones the solver left.
+        """
+        n = world.count
+        x, y, width, height = world.x[:n], world.y[:n], world.width[:n], world.height[:n]
+        player_no = world.player_no[:n]
+
+        if active is not None and not active.any():
+            # A fully settled world has nothing to test
+            self.pairs_tested = self.contacts_found = 0
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+
+        self.update_cell_size(world)
+        margin = self.contact_margin
+        move_x = (world.vx[:n] if vx is None else vx) * steps
+        move_y = (world.vy[:n] if vy is None else vy) * steps
+        min_x = x + np.minimum(move_x, 0) - margin
+        min_y = y + np.minimum(move_y, 0) - margin
+        max_x = x + width + np.maximum(move_x, 0) + margin
+        max_y = y + height + np.maximum(move_y, 0) + margin
+        i, j = grid_pairs(min_x, min_y, max_x, max_y, self.cell_size, active)
+        self.pairs_tested = len(i)
+
+        # Swept boxes overlapping on one axis and overlapping or within margin on the other
+        swept_x = np.minimum(max_x[i], max_x[j]) - np.maximum(min_x[i], min_x[j]) - 2 * margin
+        swept_y = np.minimum(max_y[i], max_y[j]) - np.maximum(min_y[i], min_y[j]) - 2 * margin
+        touching = (
+            ((swept_x > 0) & (swept_y > -margin) | (swept_y > 0) & (swept_x > -margin))
+            & (player_no[i] != player_no[j])
+        )
+        i, j = i[touching], j[touching]
+        self.contacts_found = len(i)
+        return i, j
+
+    def boundary_contacts(self, world, active, winwidth, winheight, steps=0, vx=None, vy=None):
+        """
+        Returns rows of active blocks touching, or reaching within steps, the floor, left wall and right wall,
+        and which boundary each touches. vx and vy are the velocities to sweep by, like for find_contacts.
+        """
+        n = world.count
+        x, y, width, height = world.x[:n], world.y[:n], world.width[:n], world.height[:n]
+        move_x = (world.vx[:n] if vx is None else vx) * steps
+        move_y = (world.vy[:n] if vy is None else vy) * steps
+        margin = self.contact_margin
+        rows = (
+            np.flatnonzero(active & (y + height + np.maximum(move_y, 0) > winheight - margin)),
+            np.flatnonzero(active & (x + np.minimum(move_x, 0) < margin)),
+            np.flatnonzero(active & (x + width + np.maximum(move_x, 0) > winwidth - margin)),
+        )
+        boundary = np.repeat([FLOOR, LEFT_WALL, RIGHT_WALL], [len(r) for r in rows])
+        return np.concatenate(rows), boundary
+
+    @staticmethod
+    def boundary_depth(world, rows, boundary, winwidth, winheight):
+        """
+        How far each row is past the boundary it touches, negative for rows that are apart from it.
+        """
+        x, y, width, height = world.x[rows], world.y[rows], world.width[rows], world.height[rows]
+        return np.select([boundary == FLOOR, boundary == LEFT_WALL], [y + height - winheight, -x], x + width - winwidth)
+
+    def sweep_contacts(self, world, i, j, rows, boundary, steps, winwidth, winheight):
+        """
+        Continuous collision detection for the contacts found by find_contacts and boundary_contacts.
+        Pairs with a row moving further than ccd_distance in the step that are not touching yet are swept against
+        each other over the step (time_of_impact) and get the axis they meet on, which the side of the contact is
+        taken from, and the time of impact. Such rows approaching the floor or a wall get the time they reach it.
+        A fast row only keeps its first impact of the step on each side and the ones at the same time: whatever it
+        would hit after that on the same side is behind what it hits first and is dropped.
+        Swept contacts that do not meet within the step stay speculative contacts like the ones that are not swept,
+        on the axis they would meet on last. The solver may still change the velocities so they do meet, e.g. of
+        two blocks falling together when the lower one lands.
+        Returns the remaining i, j, rows and boundary, and for each remaining contact, pairs first, the time of
+        impact, 0 for contacts that do not meet within the step, and the axis of the pairs, -1 where it is not
+        swept.
+        """
+        n = world.count
+        x, y, width, height = world.x[:n], world.y[:n], world.width[:n], world.height[:n]
+        move_x, move_y = world.vx[:n] * steps, world.vy[:n] * steps
+        margin = self.contact_margin
+        fast = np.hypot(move_x, move_y) > self.ccd_distance
+        if not fast.any():
+            # Nothing to sweep, e.g. a settling pile
+            self.contacts_swept = self.contacts_occluded = 0
+            return i, j, rows, boundary, np.zeros(len(i) + len(rows)), np.full(len(i), -1)
+
+        overlap_y = np.minimum(y[i] + height[i], y[j] + height[j]) - np.maximum(y[i], y[j])
+        overlap_x = np.minimum(x[i] + width[i], x[j] + width[j]) - np.maximum(x[i], x[j])
+        touching = (overlap_x > 0) & (overlap_y > -margin) | (overlap_y > 0) & (overlap_x > -margin)
+        swept = np.flatnonzero((fast[i] | fast[j]) & ~touching)
+        pair_toi = np.zeros(len(i))
+        pair_axis = np.full(len(i), -1)
+        pair_toi[swept], pair_axis[swept] = time_of_impact(x, y, width, height, move_x, move_y, i[swept], j[swept])
+
+        # Boundaries do not move, the gap to them over the distance moved towards them
+        gap = np.select(
+            [boundary == FLOOR, boundary == LEFT_WALL],
+            [winheight - y[rows] - height[rows], x[rows]],
+            winwidth - x[rows] - width[rows],
+        )
+        towards = np.select([boundary == FLOOR, boundary == LEFT_WALL], [move_y[rows], -move_x[rows]], move_x[rows])
+        boundary_swept = fast[rows] & (gap > margin)
+        boundary_toi = np.zeros(len(rows))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            boundary_toi[boundary_swept] = np.where(towards[boundary_swept] > 0, gap[boundary_swept] / towards[boundary_swept], np.inf)
+
+        # First impact of every fast row on each of its sides, in the top, bottom, left, right order of the contact
+        # sides. Hitting something only stops a row moving that way, not what it hits on its other side
+        first = np.full((n, 4), np.inf)
+        hit = swept[pair_toi[swept] <= 1]
+        axis = np.maximum(pair_axis, 0)  # Contacts that are not swept have time 0, never behind anything
+        i_first = np.where(
+            axis == 0, 2 * y[i] + height[i] < 2 * y[j] + height[j], 2 * x[i] + width[i] < 2 * x[j] + width[j],
+        )
+        side_i = 2 * axis + i_first
+        side_j = 2 * axis + ~i_first
+        boundary_side = np.select([boundary == FLOOR, boundary == LEFT_WALL], [1, 2], 3)
+        np.minimum.at(first, (i[hit], side_i[hit]), pair_toi[hit])
+        np.minimum.at(first, (j[hit], side_j[hit]), pair_toi[hit])
+        np.minimum.at(first, (rows[boundary_swept], boundary_side[boundary_swept]), boundary_toi[boundary_swept])
+        first[~fast] = np.inf
+        # Contacts that do not meet within the step are behind nothing and stay speculative, ordered like the
+        # contacts that are not swept
+        pair_toi[pair_toi > 1] = 0
+        boundary_toi[boundary_toi > 1] = 0
+        keep = (pair_toi <= first[i, side_i] + 1e-9) & (pair_toi <= first[j, side_j] + 1e-9)
+        keep_boundary = boundary_toi <= first[rows, boundary_side] + 1e-9
+
+        self.contacts_swept = len(swept) + int(boundary_swept.sum())
+        self.contacts_occluded = int((~keep).sum() + (~keep_boundary).sum())
+        return (
+            i[keep], j[keep], rows[keep_boundary], boundary[keep_boundary],
+            np.concatenate((pair_toi[keep], boundary_toi[keep_boundary])), pair_axis[keep],
+        )
+
+    def solve(self, vx, vy, a, b, vertical, target, inverse_mass, impulse, batches):
+        """
+        Runs `iterations` rounds moving the velocity of each contact along its normal towards its target, one batch
+        at a time so every batch sees the velocities the batches before it left (Gauss-Seidel). Starts from and
+        returns the accumulated impulses, which only ever push.
+        """
+        apply_impulses(vx, vy, a, b, vertical, impulse, inverse_mass)
+
+        # Both velocity columns interleaved in one array, so a contact's normal velocity is one element
+        velocity = np.stack((vx, vy), axis=1).ravel()
+        normal_a = 2 * a + vertical
+        normal_b = 2 * b + vertical
+        batches = [
+            (
+                batch, normal_a[batch], normal_b[batch], inverse_mass[a[batch]], inverse_mass[b[batch]],
+                1 / (inverse_mass[a[batch]] + inverse_mass[b[batch]]), target[batch], impulse[batch],
+            )
+            for batch in batches
+        ]
+        for _ in range(self.iterations):
+            for batch, batch_a, batch_b, inverse_a, inverse_b, mass, batch_target, batch_impulse in batches:
+                closing = velocity[batch_a] - velocity[batch_b]
+                total = np.maximum(batch_impulse + (closing - batch_target) * mass, 0)
+                change = total - batch_impulse
+                batch_impulse[:] = total
+                velocity[batch_a] -= change * inverse_a
+                velocity[batch_b] += change * inverse_b
+
+        vx[:] = velocity[0::2]
+        vy[:] = velocity[1::2]
+        impulse = impulse.copy()
+        for batch, *_, batch_impulse in batches:
+            impulse[batch] = batch_impulse
+        return impulse
+
+    def resolve(self, world, steps=1, winwidth=np.inf, winheight=np.inf, wake_speed=np.inf, gravity=0):
+        """
+        Finds and solves every contact of an awake row for a step of `steps` 1/60 s frames, changing velocities and
+        pushing overlapping rows apart. A sleeping row hit by an awake row moving faster than wake_speed is woken up,
+        otherwise it does not move.
+        `gravity` is what World.apply_gravity added to the awake rows for this step, it does not count towards
+        bouncing.
+        Returns the mask of rows resting on a block underneath or on the floor.
+        """
+        n = world.count
+        supported = np.zeros(n, dtype=bool)
+        active = ~world.asleep[:n]
+        i, j = self.find_contacts(world, active, steps)
+        rows, boundary = self.boundary_contacts(world, active, winwidth, winheight, steps)
+        i, j, rows, boundary, toi, swept_axis = self.sweep_contacts(world, i, j, rows, boundary, steps, winwidth, winheight)
+        if len(i) == 0 and len(rows) == 0:
+            self.contacts_persisted = self.contacts_late = 0
+            return supported
+
+        x, y, width, height = world.x[:n], world.y[:n], world.width[:n], world.height[:n]
+        mass, elasticity, body_id = world.mass[:n], world.elasticity[:n], world.body_id[:n]
+
+        asleep = world.asleep[:n]
+        fell = np.append(~asleep, False)  # Rows apply_gravity accelerated this step, not the floor and walls
+        speed = np.hypot(world.vx[:n], world.vy[:n])
+        world.wake(np.concatenate((
+            i[asleep[i] & ~asleep[j] & (speed[j] > wake_speed)],
+            j[asleep[j] & ~asleep[i] & (speed[i] > wake_speed)],
+        )))
+
+        # The floor and walls are one extra row at index n that never moves, like blocks still asleep
+        static = n
+        vx = np.append(world.vx[:n], 0)
+        vy = np.append(world.vy[:n], 0)
+        inverse_mass = np.append(np.where(asleep, 0, 1 / mass), 0)
+
+        # Side seen from i, in the same top, bottom, left, right order as get_closest_side: the axis the boxes
+        # overlap least on, or are furthest apart on, or swept boxes meet on, and which way round they are on it.
+        # Contacts from the last step keep their side while it is within side_hysteresis pixels of that axis,
+        # so a block resting near a corner does not flip between sides
+        keys, i_first = pair_keys(body_id, i, j)
+        overlap = np.stack((
+            np.minimum(y[i] + height[i], y[j] + height[j]) - np.maximum(y[i], y[j]),
+            np.minimum(x[i] + width[i], x[j] + width[j]) - np.maximum(x[i], x[j]),
+        ))
+        i_first_on_axis = np.stack((
+            2 * y[i] + height[i] < 2 * y[j] + height[j],
+            2 * x[i] + width[i] < 2 * x[j] + width[j],
+        ))
+        axis = np.where(swept_axis >= 0, swept_axis, np.argmin(overlap, axis=0))
+        side = 2 * axis + np.take_along_axis(i_first_on_axis, axis[None], axis=0)[0]
+
+        # a is the upper block of a vertical contact or the left block of a horizontal one, b the other.
+        # Blocks lie on the floor and right wall, the left wall lies left of its blocks
+        on_left_wall = boundary == LEFT_WALL
+        boundary_keys = (boundary << 32) | body_id[rows]
+        keys = np.concatenate((keys, boundary_keys))
+        persisted, cached_side, cached_impulse = self.cache.lookup(keys)
+        self.contacts_persisted = int(persisted.sum())
+        cached_side = np.where(i_first, cached_side[:len(i)], cached_side[:len(i)] ^ 1)
+        keep = persisted[:len(i)] & (swept_axis < 0) & (
+            np.take_along_axis(overlap, cached_side[None] // 2, axis=0)[0] <= overlap.min(axis=0) + self.side_hysteresis
+        )
+        side = np.concatenate((
+            np.where(keep, cached_side, side),
+            np.select([boundary == FLOOR, on_left_wall], [1, 2], 3),
+        ))
+        i = np.concatenate((i, rows))
+        j = np.concatenate((j, np.full(len(rows), static)))
+        vertical = side < 2
+        a_is_i = (side == 1) | (side == 3)
+        a = np.where(a_is_i, i, j)
+        b = np.where(a_is_i, j, i)
+
+        # Penetration along the normal, negative for blocks that are apart
+        pairs = slice(len(i) - len(rows))
+        pair_a, pair_b = a[pairs], b[pairs]
+        depth = np.concatenate((
+            np.where(vertical[pairs], y[pair_a] + height[pair_a] - y[pair_b], x[pair_a] + width[pair_a] - x[pair_b]),
+            self.boundary_depth(world, rows, boundary, winwidth, winheight),
+        ))
+
+        # Contacts between two rows that cannot move are left out. The rest are solved in order of time of impact,
+        # and contacts at the same time, like every contact that is not swept, bottom up, the lowest contacts first,
+        # so the weight of a pile reaches the floor within few iterations
+        movable = inverse_mass[a] + inverse_mass[b] > 0
+        contact_y = np.append(y, winheight)
+        order = np.flatnonzero(movable)[np.lexsort((-contact_y[b][movable], toi[movable]))]
+        batches = independent_batches(a, b, static, order)
+
+        # Target velocity along the normal from a to b, positive when the blocks move into each other.
+        # Contacts may close the gap between blocks that are not touching yet, touching ones stop. Contacts
+        # approaching faster than rest_speed that touch within the step bounce with the pair's elasticity.
+        # Bounces are decided on and rebound with the speed before this step's gravity: a block settling onto
+        # another picks up a step of gravity over its last gap, which would otherwise keep it bouncing forever
+        closing = np.where(vertical, vy[a] - vy[b], vx[a] - vx[b])
+        approach = closing - np.where(vertical, gravity * steps * (fell[a].astype(np.float64) - fell[b]), 0)
+        elasticity = np.append(elasticity, 0)
+        e = np.where(b == static, elasticity[a], np.where(a == static, elasticity[b], (elasticity[a] + elasticity[b]) / 2))
+        gap = np.maximum(-depth, 0)
+        bounces = (approach > self.rest_speed) & (closing * steps >= gap)
+        target = np.where(bounces, -e * approach, gap / steps)
+
+        # Warm start with part of last step's impulse, then iterate towards the target
+        start_vx, start_vy = vx.copy(), vy.copy()
+        impulse = self.warm_start * np.maximum(cached_impulse, 0)
+        impulse = self.solve(vx, vy, a, b, vertical, target, inverse_mass, impulse, batches)
+        stored_side = np.where(np.append(i_first, np.ones(len(rows), dtype=bool)), side, side ^ 1)
+
+        # The solver can send a row somewhere its contacts were not looked for, e.g. a block knocked down onto one
+        # below that was moving away or onto the floor, which it would then sink into, or a sleeping block woken up
+        # above. Rows whose velocity changed by more than contact_margin over the step are looked up again with their
+        # new velocity, and the contacts they gain are solved together with the others, starting over from the
+        # velocities before the solve. That can send other rows somewhere new in turn, so it is repeated up to
+        # late_passes times
+        self.contacts_late = 0
+        for _ in range(self.late_passes):
+            changed = ~asleep & (np.hypot(vx[:n] - start_vx[:n], vy[:n] - start_vy[:n]) * steps > self.contact_margin)
+            if not changed.any():
+                break
+            pairs_tested, contacts_found = self.pairs_tested, self.contacts_found
+            late_i, late_j = self.find_contacts(world, changed, steps, vx[:n], vy[:n])
+            self.pairs_tested += pairs_tested
+            self.contacts_found += contacts_found
+            late_keys, late_i_first = pair_keys(body_id, late_i, late_j)
+            new = ~np.isin(late_keys, keys)
+            late_i, late_j, late_keys, late_i_first = late_i[new], late_j[new], late_keys[new], late_i_first[new]
+            late_rows, late_boundary = self.boundary_contacts(
+                world, changed, winwidth, winheight, steps, vx[:n], vy[:n],
+            )
+            late_boundary_keys = (late_boundary << 32) | body_id[late_rows]
+            new = ~np.isin(late_boundary_keys, keys)
+            late_rows, late_boundary, late_boundary_keys = late_rows[new], late_boundary[new], late_boundary_keys[new]
+            if len(late_i) + len(late_rows) == 0:
+                break
+            self.contacts_late += len(late_i) + len(late_rows)
+
+            # Sides like above, without sweeping or a cached side to keep
+            overlap = np.stack((
+                np.minimum(y[late_i] + height[late_i], y[late_j] + height[late_j]) - np.maximum(y[late_i], y[late_j]),
+                np.minimum(x[late_i] + width[late_i], x[late_j] + width[late_j]) - np.maximum(x[late_i], x[late_j]),
+            ))
+            i_first_on_axis = np.stack((
+                2 * y[late_i] + height[late_i] < 2 * y[late_j] + height[late_j],
+                2 * x[late_i] + width[late_i] < 2 * x[late_j] + width[late_j],
+            ))
+            late_axis = np.argmin(overlap, axis=0)
+            late_side = np.concatenate((
+                2 * late_axis + np.take_along_axis(i_first_on_axis, late_axis[None], axis=0)[0],
+                np.select([late_boundary == FLOOR, late_boundary == LEFT_WALL], [1, 2], 3),
+            ))
+            late_vertical = late_side < 2
+            a_is_i = (late_side == 1) | (late_side == 3)
+            late_a = np.where(a_is_i, np.append(late_i, late_rows), np.append(late_j, np.full(len(late_rows), static)))
+            late_b = np.where(a_is_i, np.append(late_j, np.full(len(late_rows), static)), np.append(late_i, late_rows))
+            pair_a, pair_b = late_a[:len(late_i)], late_b[:len(late_i)]
+            late_depth = np.concatenate((
+                np.where(
+                    late_vertical[:len(late_i)],
+                    y[pair_a] + height[pair_a] - y[pair_b], x[pair_a] + width[pair_a] - x[pair_b],
+                ),
+                self.boundary_depth(world, late_rows, late_boundary, winwidth, winheight),
+            ))
+
+            # Late contacts were not about to meet before the solve, so they only ever close their gap
+            a = np.concatenate((a, late_a))
+            b = np.concatenate((b, late_b))
+            vertical = np.concatenate((vertical, late_vertical))
+            depth = np.concatenate((depth, late_depth))
+            target = np.concatenate((target, np.maximum(-late_depth, 0) / steps))
+            impulse = np.concatenate((impulse, np.zeros(len(late_a))))
+            toi = np.concatenate((toi, np.zeros(len(late_a))))
+            keys = np.concatenate((keys, late_keys, late_boundary_keys))
+            late_i_first = np.append(late_i_first, np.ones(len(late_rows), dtype=bool))
+            stored_side = np.concatenate((stored_side, np.where(late_i_first, late_side, late_side ^ 1)))
+
+            movable = inverse_mass[a] + inverse_mass[b] > 0
+            order = np.flatnonzero(movable)[np.lexsort((-contact_y[b][movable], toi[movable]))]
+            batches = independent_batches(a, b, static, order)
+            vx[:], vy[:] = start_vx, start_vy
+            impulse = self.solve(vx, vy, a, b, vertical, target, inverse_mass, impulse, batches)
+        self.cache.store(keys, stored_side, impulse)
+
+        # A bounce is a speed the pair has to part at, which a block caught between two others cannot always meet
+        # without being pushed into one of them. One more solve without the bounces only pushes apart the contacts
+        # that would still close more than their gap, taking away from the bounces instead
+        if bounces.any():
+            self.solve(vx, vy, a, b, vertical, np.maximum(-depth, 0) / steps, inverse_mass, np.zeros(len(a)), batches)
+
+        # Overlap beyond the slop is pushed out by moving the blocks apart directly, a baumgarte fraction per step,
+        # instead of through their velocities, which would throw overlapping blocks apart (split impulses).
+        # Every contact takes part, so a block is not pushed into the floor or a block it merely touches
+        if (depth > self.slop).any():
+            target = np.where(depth > self.slop, -self.baumgarte * (depth - self.slop), np.maximum(-depth, 0))
+            shift_x, shift_y = np.zeros(n + 1), np.zeros(n + 1)
+            self.solve(shift_x, shift_y, a, b, vertical, target, inverse_mass, np.zeros(len(a)), batches)
+            x += shift_x[:n]
+            y += shift_y[:n]
+            # Rows pushed apart faster than wake_speed are not at rest yet, even when their velocity is small
+            world.quiet_time[:n][np.hypot(shift_x[:n], shift_y[:n]) > wake_speed * steps] = 0
+
+        world.vx[:n] = vx[:n]
+        world.vy[:n] = vy[:n]
+        supported[a[vertical & (a < n)]] = True
+        return supported
@@ -0,0 +1,183 @@
+"""
+Physics/render split.
+
+A PhysicsThread steps a Game in real time on a thread of its own and publishes the state the screen needs after
+every step into a FrameBuffer. The buffer holds two preallocated Frames: the front one, complete and read by the
+render loop, and the back one, which the next step is written into and which is swapped to the front once it is
+complete. The render loop only ever sees complete frames and draws without holding anything the physics needs:
+
+    with frames.latest() as frame:
+        views = frame_views.update(frame)
+
+Neither loop waits for the other, apart from game.lock around a step and around the render loop's input handling.
+Both are Python threads sharing the GIL, so they overlap where NumPy and pygame release it and take turns
+otherwise. A physics step that takes longer than dt slows drawing down, drawing does not hold the physics back.
+"""
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from time import perf_counter
+import numpy as np
+
+# One record per World row, in row order
+BODY = np.dtype([
+    ("body_id", "<i8"),
+    ("previous_x", "<f8"),
+    ("previous_y", "<f8"),
+    ("x", "<f8"),
+    ("y", "<f8"),
+    ("width", "<f8"),
+    ("height", "<f8"),
+    ("angle", "<f8"),
+    ("color", "u1", (3,)),
+])
+# One record per MassSpringMesh particle, mesh after mesh
+POINT = np.dtype([("previous_x", "<f8"), ("previous_y", "<f8"), ("x", "<f8"), ("y", "<f8")])
+
+COPIED = ("previous_x", "previous_y", "x", "y", "width", "height", "angle")
+
+
+class Frame:
+    """
+    Render state of a Game after one physics step. The arrays are kept and refilled in place, they only grow.
+    """
+    def __init__(self):
+        self.bodies = np.zeros(0, dtype=BODY)
+        self.count = 0  # Rows of bodies in use
+        self.fancy_blocks = np.zeros((0, 4), dtype=np.int64)  # Rows of the nw, ne, se and sw corners in bodies
+        self.points = np.zeros(0, dtype=POINT)
+        self.meshes = []  # (mesh, first point, point count). The mesh is only used for its edges, color and filling
+        self.step = -1
+        self.sim_time = 0
+        self.time = 0  # perf_counter() when the frame was published
+
+    def fill(self, game):
+        world = game.world
+        n = world.count
+        if len(self.bodies) < n:
+            self.bodies = np.zeros(world.capacity, dtype=BODY)
+            self.count = 0
+        bodies = self.bodies[:n]
+        ids = world.body_id[:n]
+        # Colors are not a World column, so they are only gathered again when the rows changed
+        if self.count != n or not np.array_equal(bodies["body_id"], ids):
+            bodies["body_id"] = ids
+            bodies["color"] = np.array([block.color for block in world.blocks], dtype=np.uint8).reshape(-1, 3)
+        for name in COPIED:
+            bodies[name] = getattr(world, name)[:n]
+        self.count = n
+
+        self.fancy_blocks = np.array([fancy_block.corner_rows() for fancy_block in game.fancy_players], dtype=np.int64).reshape(-1, 4)
+
+        total = sum(len(mesh) for mesh in game.meshes)
+        if len(self.points) < total:
+            self.points = np.zeros(max(total, 2 * len(self.points)), dtype=POINT)
+        self.meshes = []
+        start = 0
+        for mesh in game.meshes:
+            points = self.points[start:start + len(mesh)]
+            for name in POINT.names:
+                points[name] = getattr(mesh, name)
+            self.meshes.append((mesh, start, len(mesh)))
+            start += len(mesh)
+
+
+class FrameBuffer:
+    """
+    Double buffer of Frames with one writer, the physics thread, and one reader, the render loop.
+    When a frame is published while the front frame is being read, the swap waits for the reader to finish.
+    A step published before that overwrites the waiting frame, the reader always gets the newest complete one.
+    """
+    def __init__(self):
+        self.frames = [Frame(), Frame()]
+        self.front = 0
+        self.lock = Lock()  # Only held to look at or swap front, never while a frame is written or drawn
+        self.reading = False
+        self.pending = False  # The back frame is complete and waits for the reader to let go of the front one
+        self.published = 0
+        # Steps published while the reader held the front frame and overwritten by the next one before it was ever
+        # drawn, since the start. Game.run adds it to the render profiler, shown by the F3 overlay
+        self.frames_overwritten = 0
+
+    def publish(self, game):
+        """
+        Writes the game's current state into the back frame and makes it the front frame. Run by the writer.
+        """
+        with self.lock:
+            if self.pending:
+                self.frames_overwritten += 1
+            self.pending = False  # The back frame is no longer complete
+            back = self.frames[1 - self.front]
+        back.fill(game)
+        back.step = self.published
+        back.sim_time = game.sim_time
+        back.time = perf_counter()
+        self.published += 1
+        with self.lock:
+            if self.reading:
+                self.pending = True
+            else:
+                self.front = 1 - self.front
+
+    @contextmanager
+    def latest(self):
+        """
+        Gives the newest complete frame. It stays unchanged until the with block ends, so keep the block short.
+        """
+        with self.lock:
+            self.reading = True
+            frame = self.frames[self.front]
+        try:
+            yield frame
+        finally:
+            with self.lock:
+                self.reading = False
+                if self.pending:
+                    self.front = 1 - self.front
+                    self.pending = False
+
+
+class PhysicsThread(Thread):
+    """
+    Runs the physics steps of a Game on a thread of its own, one every game.dt seconds of real time, and publishes
+    each one to frames. Every step runs with game.lock held; the render loop takes it for the input handling that
+    changes the world, e.g. creating, deleting and grabbing blocks. An exception in a step stops the thread and is
+    kept in error for the render loop to raise.
+    When the steps fall further behind real time than game.max_frame_time the steps in between are dropped and the
+    simulation runs slower than real time. The steps dropped so far are the steps_dropped counter of every step in
+    game.profiler, which the F3 overlay shows.
+    """
+    def __init__(self, game, frames):
+        super().__init__(name="physics", daemon=True)
+        self.game = game
+        self.frames = frames
+        self.stopping = Event()
+        self.error = None
+        self.time_dropped = 0.0  # Seconds of simulated time skipped
+
+    def run(self):
+        game = self.game
+        next_step = perf_counter()
+        try:
+            while not self.stopping.is_set():
+                now = perf_counter()
+                if now < next_step:
+                    self.stopping.wait(next_step - now)
+                    continue
+                # Steps further behind than max_frame_time are skipped, so a slow stretch can not snowball
+                if next_step < now - game.max_frame_time:
+                    self.time_dropped += now - game.max_frame_time - next_step
+                    next_step = now - game.max_frame_time
+                with game.lock:
+                    game.profiler.count("steps_dropped", int(self.time_dropped / game.dt))
+                    game.update_world()
+                    game.record_frame()
+                    self.frames.publish(game)
+                    game.profiler.end_frame()
+                next_step += game.dt
+        except Exception as error:
+            self.error = error
+
+    def stop(self):
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
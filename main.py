@@ -2,11 +2,36 @@ import pygame as pg
 import sys
 import math
 import os
+from threading import Lock
+from time import perf_counter
+import numpy as np
 from rich.console import Console
+from broadphase import SweepAndPrune, GridIndex
+from world import World, BodyList, column_property
+from contacts import ContactPipeline
+from constraints import DistanceConstraints
+from softbody import MassSpringMesh
+from snapshot import BODY, FANCY_BLOCK, CONTACT, write_snapshot, read_snapshot
+from replay import ReplayRecorder
+from trajectory import TrajectorySink
+from settings import SettingsPanel
+from sat import sat_collide
+from render import SurfaceCache, DirtyRectRenderer, FrameViews
+from framebuffer import FrameBuffer, PhysicsThread
+from profiler import FrameProfiler
 
 console = Console()
 
+# Gravity, friction, air resistance and velocities are all tuned per 1/60 s frame.
+# A physics step of dt seconds covers dt / FRAME_TIME frames.
+FRAME_TIME = 1 / 60
+
 class Fancy_Block:
+    # No per-instance __dict__, and quantities that follow from the state are properties instead of stored copies
+    __slots__ = (
+        "parent", "x", "y", "width", "height", "rigidness", "mass", "ne", "nw", "se", "sw", "angular_velocity", "angle",
+    )
+
     def __init__(self, x, y, width, height, parent=None, elasticity=0.8, player_no=0, rigidness = 0.5):
         self.parent: Game = parent
         self.x = x 
@@ -26,13 +51,51 @@ class Fancy_Block:
         self.parent.players.append(self.se)
         self.parent.players.append(self.sw)
 
-        self.kinetic_energy = 1/2 * self.mass * (self.ne.vx**2 + self.ne.vy**2)
-        self.potential_energy = self.mass * self.parent.gravity * self.y
+        # Edges and diagonals that keep the corners square, solved for every Fancy_Block at once by the Game
+        diagonal = math.sqrt(width**2 + height**2)
+        nw, ne, se, sw = self.corner_ids()
+        self.parent.constraints.add(
+            [nw, nw, ne, sw, nw, ne],
+            [ne, sw, se, se, se, sw],
+            [width, height, height, width, diagonal, diagonal],
+        )
 
         self.angular_velocity = 0
-        self.moment_of_inertia = (1 / 12) * self.mass * (self.width**2 + self.height**2)
         self.angle = 0
 
+    @classmethod
+    def from_corners(cls, parent, nw, ne, se, sw, width, height, rigidness=0.5):
+        """
+        Makes a Fancy_Block out of existing corner Blocks, e.g. ones loaded from a snapshot. Unlike __init__ this
+        adds no distance constraints between the corners, the caller adds those.
+        """
+        fancy_block = cls.__new__(cls)
+        fancy_block.parent = parent
+        fancy_block.width = width
+        fancy_block.height = height
+        fancy_block.rigidness = rigidness
+        fancy_block.mass = width * height
+        fancy_block.nw, fancy_block.ne, fancy_block.se, fancy_block.sw = nw, ne, se, sw
+        for corner in (nw, ne, se, sw):
+            corner.fancy_parent = fancy_block
+        fancy_block.update_position()
+        fancy_block.angular_velocity = 0
+        fancy_block.angle = 0
+        return fancy_block
+
+    @property
+    def kinetic_energy(self):
+        vx, vy = self.get_velocity()
+        return 1/2 * self.mass * (vx**2 + vy**2)
+
+    @property
+    def potential_energy(self):
+        return self.mass * self.parent.gravity * self.y
+
+    @property
+    def moment_of_inertia(self):
+        return (1 / 12) * self.mass * (self.width**2 + self.height**2)
+
     def get_velocity(self):
         """
         Calculates the average velocity of the Fancy_Block based on its corners.
@@ -43,22 +106,12 @@ class Fancy_Block:
         return avg_vx, avg_vy
 
 
-    def draw(self, screen):
-        # Enforce distance constraints between sub-blocks
+    def update(self):
+        # The corners are World rows, moved and collided with every other block by Game.update_world, and the
+        # distance constraints between them were already enforced there
         self.rigidness = self.parent.rigidness
-        
-        self.force_distance_between()
         self.update_position()
 
-        # Update the positions of each block
-        self.ne.update(True, self.nw, self.se, self.width, self.height)
-        self.nw.update(True, self.ne, self.sw, self.width, self.height)
-        self.se.update(True, self.sw, self.ne, self.width, self.height)
-        self.sw.update(True, self.se, self.nw, self.width, self.height)
-
-
-        pg.draw.polygon(screen, (0, 128, 255), [(self.nw.x, self.nw.y), (self.ne.x, self.ne.y), (self.se.x, self.se.y), (self.sw.x, self.sw.y)])
-
     def apply_impulse(self, dvx, dvy):
         """
         Applies a change in velocity to the Fancy_Block and its corners.
@@ -124,368 +177,125 @@ class Fancy_Block:
         self.x = (self.nw.x + self.ne.x + self.sw.x + self.se.x) / 4
         self.y = (self.nw.y + self.ne.y + self.sw.y + self.se.y) / 4
 
-        for block in self.parent.fancy_players:
-            if block != self:
-                if self.detect_collision(block):
-                    pass
-        
-
-        
-        
-
-
-        
-        
-
-    
-    def force_distance_between(self):
-        """
-        Enforces the correct distances between the sub-blocks to maintain the square.
-        """
-        # Define the pairs of blocks and the expected distances
-        pairs = [
-            (self.nw, self.ne, self.width),  # Top edge
-            (self.nw, self.sw, self.height),  # Left edge
-            (self.ne, self.se, self.height),  # Right edge
-            (self.sw, self.se, self.width),  # Bottom edge
-            (self.nw, self.se, math.sqrt(self.width**2 + self.height**2)),  # Diagonal
-            (self.ne, self.sw, math.sqrt(self.width**2 + self.height**2)),  # Diagonal
-        ]
-
-        for block1, block2, target_distance in pairs:
-            # Calculate the current distance between the blocks
-            dx = block2.x - block1.x
-            dy = block2.y - block1.y
-            current_distance = math.sqrt(dx**2 + dy**2)
-
-            # Skip if the blocks are already at the correct distance
-            if current_distance == 0 or current_distance == target_distance:
-                continue
-
-            # Calculate the correction needed
-            correction = (current_distance - target_distance) / 2
-            correction_dx = correction * (dx / current_distance)
-            correction_dy = correction * (dy / current_distance)
-
-            # Apply corrections symmetrically to the blocks
-            block1.x += correction_dx
-            block1.y += correction_dy
-            block2.x -= correction_dx
-            block2.y -= correction_dy
-
-            # Adjust velocities to match the correction (damping effect)
-
-            block1.vx += correction_dx * self.rigidness
-            block1.vy += correction_dy * self.rigidness
-            block2.vx -= correction_dx * self.rigidness
-            block2.vy -= correction_dy * self.rigidness
-
-    def project(self, axis):
-            """
-            Projects the Fancy_Block onto an axis for the Separating Axis Theorem.
-            Returns the min and max projections.
-            """
-            points = [
-                (self.nw.x, self.nw.y),
-                (self.ne.x, self.ne.y),
-                (self.se.x, self.se.y),
-                (self.sw.x, self.sw.y),
-            ]
-            # Dot product to project points onto the axis
-            projections = [(point[0] * axis[0] + point[1] * axis[1]) for point in points]
-            return min(projections), max(projections)
-
-    def get_axes(self):
-        """
-        Returns the axes perpendicular to each edge of the Fancy_Block.
-        """
-        points = [
-            (self.nw.x, self.nw.y),
-            (self.ne.x, self.ne.y),
-            (self.se.x, self.se.y),
-            (self.sw.x, self.sw.y),
-        ]
-        axes = []
-        for i in range(len(points)):
-            # Get edge vector
-            p1 = points[i]
-            p2 = points[(i + 1) % len(points)]
-            edge = (p2[0] - p1[0], p2[1] - p1[1])
-            # Get perpendicular vector
-            axis = (-edge[1], edge[0])  # Rotate 90 degrees
-            # Normalize the axis
-            length = (axis[0]**2 + axis[1]**2)**0.5
-            axes.append((axis[0] / length, axis[1] / length))
-        return axes
-    
-    def find_collision_point(self, axis, other):
+    def corner_ids(self):
         """
-        Finds the collision point and corner along the given axis.
+        Returns the body ids of the corners in nw, ne, se, sw order.
         """
-        # Project all corners of both blocks onto the axis
-        self_points = [
-            (self.nw.x, self.nw.y),
-            (self.ne.x, self.ne.y),
-            (self.se.x, self.se.y),
-            (self.sw.x, self.sw.y),
-        ]
-        other_points = [
-            (other.nw.x, other.nw.y),
-            (other.ne.x, other.ne.y),
-            (other.se.x, other.se.y),
-            (other.sw.x, other.sw.y),
-        ]
-
-        # Calculate projections for each corner
-        projections = []
-        for point in self_points:
-            proj = point[0] * axis[0] + point[1] * axis[1]
-            projections.append((proj, point))
-        for point in other_points:
-            proj = point[0] * axis[0] + point[1] * axis[1]
-            projections.append((proj, point))
-
-        # Sort projections to find the closest points
-        projections.sort(key=lambda x: x[0])
-
-        # Collision point is the overlap between the closest points
-        collision_point = projections[0][1]  # The point on the edge of overlap
-        collision_corner = projections[0][1]  # This is the corner causing collision
-
-        return collision_point, collision_corner
+        return [corner.world.body_id[corner.index] for corner in (self.nw, self.ne, self.se, self.sw)]
 
-
-    def detect_collision(self, other):
+    def corner_rows(self):
         """
-        Detects collision between this Fancy_Block and another Fancy_Block using SAT.
-        Returns:
-        - (collision: bool, collision_point: tuple, collision_corner: tuple or None)
+        Returns the World rows of the corners in nw, ne, se, sw order.
         """
-        axes = self.get_axes() + other.get_axes()  # Combine axes from both blocks
-
-        min_overlap = float("inf")
-        collision_axis = None
-        collision_corner = None
-
-        for axis in axes:
-            # Get projections for both blocks
-            min_a, max_a = self.project(axis)
-            min_b, max_b = other.project(axis)
-
-            # Check for overlap
-            if max_a < min_b or max_b < min_a:
-                # No overlap on this axis, no collision
-                return False, None, None
-
-            # Calculate overlap distance
-            overlap = min(max_a, max_b) - max(min_a, min_b)
-            if overlap < min_overlap:
-                min_overlap = overlap
-                collision_axis = axis
-
-        # Find the collision point (if collision detected)
-        collision_point = self.find_collision_point(collision_axis, other)
-
-        # Handle collision response
-        self.handle_collision_response(collision_point, collision_axis, other, min_overlap)
-
-        return True
-
-    
-        
-
-
-
+        return [self.nw.index, self.ne.index, self.se.index, self.sw.index]
 
+    def get_bounds(self):
+        """
+        Returns the axis aligned bounding box of the corners as (min_x, min_y, max_x, max_y).
+        """
+        xs = (self.nw.x, self.ne.x, self.se.x, self.sw.x)
+        ys = (self.nw.y, self.ne.y, self.se.y, self.sw.y)
+        return min(xs), min(ys), max(xs), max(ys)
 
 
 class Block:
+    # Per-body state lives in the parent's World arrays, a Block is a view onto one row.
+    # The few attributes it keeps itself are slots, there is no per-instance __dict__
+    __slots__ = ("parent", "world", "index", "color", "fancy_parent", "angular_velocity", "line", "air_resistance")
+
+    x = column_property("x")
+    y = column_property("y")
+    vx = column_property("vx")
+    vy = column_property("vy")
+    angle = column_property("angle")
+    width = column_property("width")
+    height = column_property("height")
+    mass = column_property("mass")
+    eslasticity = column_property("elasticity")
+    player_no = column_property("player_no")
+    asleep = column_property("asleep")
+
     def __init__(self, x, y, width, height, parent=None, elasticity=0.8, player_no=0, fancy_parent=None):
         self.parent : Game = parent
+        self.world : World = self.parent.world
+        self.index = self.world.allocate(self)
         self.width = width
         self.height = height
         self.player_no = player_no
         self.x = x
         self.y = y
+        self.world.previous_x[self.index] = x
+        self.world.previous_y[self.index] = y
+        self.world.can_sleep[self.index] = fancy_parent is None  # Fancy_Block corners are moved by their Fancy_Block
         self.color = (0, 128, 255)
-        self.maxradius = math.sqrt((self.width/2)**2 + (self.height/2)**2)
         self.vx = 0
         self.vy = 0
         self.eslasticity = elasticity
 
         self.fancy_parent : Fancy_Block = fancy_parent
 
-        self.top = self.y
-        self.bottom = self.y + self.height
-        self.left = self.x
-        self.right = self.x + self.width
-
         if self.width == 0 or self.height == 0:
             self.mass = self.fancy_parent.mass
         else:
             self.mass = self.width * self.height
-        self.kinetic_energy = 1/2 * self.mass * (self.vx**2 + self.vy**2)
-        self.potential_energy = self.mass * self.parent.gravity * self.y
 
         self.angular_velocity = 0
-        self.moment_of_inertia = (1 / 12) * self.mass * (self.width**2 + self.height**2)
         self.angle = 0
+        self.line = False  # Held by the mouse rope
+        self.air_resistance = 0.995
 
-    def draw(self, screen):
-    # Draw the rotated block
-        rect = pg.Rect(0, 0, self.width, self.height)
-        rect.center = (self.x + self.width / 2, self.y + self.height / 2)
-        rotated_image = pg.Surface((self.width, self.height), pg.SRCALPHA)
-        rotated_image.fill(self.color)
-        rotated_image = pg.transform.rotate(rotated_image, math.degrees(self.angle))
-        rotated_rect = rotated_image.get_rect(center=rect.center)
-        screen.blit(rotated_image, rotated_rect.topleft)
-
-    
-    def update(self, fancy=False, fancy_block_width=None, fancy_block_height=None, fancy_width=None, fancy_height=None):
-
-        block_underneath = self.check_for_collision_with_block()
-        
-        
-        if block_underneath == False:
-            self.vy += self.parent.gravity
-        else:
-            if self.vy > 0.01:  # If falling, allow bounce
-                self.vy = -self.vy * self.eslasticity
-            else:  # If resting, do not override velocities from collision handling
-                self.vy *= 0.5  # Slight damping to simulate rest without full stop
-                self.vx *= self.parent.friction
-                return
-
-
-        self.y += self.vy
-        self.x += self.vx
-        # Check for collision with the ground
-        if self.y > self.parent.winheight - self.height:
-            self.y = self.parent.winheight - self.height
-            self.vy = -self.vy * self.eslasticity
-            self.parent.move_up = True
-        else:
-            self.vy *= self.parent.air_resistance
-
-        # Check for collision with the ceiling
-        if self.y < 0:
-            self.y = 0
-            self.vy = -self.vy * self.eslasticity
-        else:
-            self.vy *= self.parent.air_resistance
-        
-        # Check for collision with the walls
-        if self.x < 0:
-            self.vx = -self.vx * self.eslasticity
-            self.x = 0
-        elif self.x > self.parent.winwidth - self.width:
-            self.vx = -self.vx * self.eslasticity
-            self.x = self.parent.winwidth - self.width
-        else:
-            self.vx *= self.parent.air_resistance
-
-
-        self.top = self.y
-        self.bottom = self.y + self.height
-        self.left = self.x
-        self.right = self.x + self.width
-
-        self.check_for_collision_with_block()
-
-
-
-        # Apply friction
-        if self.vy == 0:
-            self.vx *= self.parent.friction
-        else:
-            self.vx *= self.parent.air_resistance
-
-
-    def get_closest_side(self, player):
-        top = abs(self.top - player.bottom)
-        bottom = abs(self.bottom - player.top)
-        left = abs(self.left - player.right)
-        right = abs(self.right - player.left)
-        
-        closest = min(top, bottom, left, right)
-        if closest == top:
-            return "top"
-        elif closest == bottom:
-            return "bottom"
-        elif closest == left:
-            return "left"
-        elif closest == right:
-            return "right"
-        
-    def fix_overlap(self, player, closest_side):
-
-        if closest_side == "top":
-            self.y = player.bottom
-            self.vy = max(self.vy, 0)  # Prevent downward velocity after correction
-        elif closest_side == "bottom":
-            self.y = player.top - self.height
-            self.vy = min(self.vy, 0)  # Prevent upward velocity after correction
-        elif closest_side == "left":
-            self.x = player.right
-        elif closest_side == "right":
-            self.x = player.left - self.width
-    
-    def energy_transfer(self, player, closest_side):
-        # Relative velocity components
-        relative_vx = self.vx - player.vx
-        relative_vy = self.vy - player.vy
-
-        # Normal vector components based on the collision side
-        if closest_side == "top" or closest_side == "bottom":
-            normal_x, normal_y = 0, 1  # Collision normal is vertical
-        elif closest_side == "left" or closest_side == "right":
-            normal_x, normal_y = 1, 0  # Collision normal is horizontal
-        else:
-            return  # Exit if side is undefined
-
-        # Calculate the normal velocity (velocity along the collision normal)
-        normal_velocity = relative_vx * normal_x + relative_vy * normal_y
-
-
-        # No collision if normal velocity is not directed toward the other object
-        if normal_velocity >= 0:
-            return
-
-        # Effective mass for collision response
-        m1 = self.mass
-        m2 = player.mass
-
-        if m1 == 0 or m2 == 0:
-            console.print("Mass is zero", style="bold red")
-
-        # Elasticity factor (average elasticity of both objects)
-        e = (self.eslasticity + player.eslasticity) / 2
-
-        # Impulse magnitude (using 1D collision formula along the normal)
-        impulse = -(1 + e) * normal_velocity / (1 / m1 + 1 / m2)
-
-        # Update velocities along the normal direction
-        self.vx += (impulse * normal_x) / m1
-        self.vy += (impulse * normal_y) / m1
-        player.vx -= (impulse * normal_x) / m2
-        player.vy -= (impulse * normal_y) / m2
-        
-        self.fix_overlap(player, closest_side)
-
-    
-    def check_for_collision_with_block(self):
-        for player in self.parent.players:
-            if player.player_no != self.player_no:
-                if self.x < player.x + player.width and self.x + self.width > player.x and self.y < player.y + player.height and self.y + self.height > player.y:
-                    # Get closest side of block
-                    closest_side = self.get_closest_side(player)
-                    self.energy_transfer(player, closest_side)
-                    self.angle += self.angular_velocity / 60
-                    if closest_side == "top" or closest_side == "bottom":
-                        return True
-        return False
-                
+    @classmethod
+    def from_row(cls, parent, index, color=(0, 128, 255), angular_velocity=0):
+        """
+        Makes a Block viewing a row of the parent's World that is already filled in, e.g. loaded from a snapshot.
+        """
+        block = cls.__new__(cls)
+        block.parent = parent
+        block.world = parent.world
+        block.index = index
+        block.color = color
+        block.fancy_parent = None
+        block.angular_velocity = angular_velocity
+        block.line = False
+        block.air_resistance = 0.995
+        return block
+
+    # Quantities that follow from the row are computed when asked for instead of stored
+    @property
+    def maxradius(self):
+        return math.sqrt((self.width/2)**2 + (self.height/2)**2)
+
+    @property
+    def kinetic_energy(self):
+        return 1/2 * self.mass * (self.vx**2 + self.vy**2)
+
+    @property
+    def potential_energy(self):
+        return self.mass * self.parent.gravity * self.y
+
+    @property
+    def moment_of_inertia(self):
+        return (1 / 12) * self.mass * (self.width**2 + self.height**2)
+
+    # Edges are derived from the row so they are never stale after a vectorized pass
+    @property
+    def top(self):
+        return self.y
+
+    @property
+    def bottom(self):
+        return self.y + self.height
+
+    @property
+    def left(self):
+        return self.x
+
+    @property
+    def right(self):
+        return self.x + self.width
+
+    def wake(self):
+        self.world.wake(self.index)
 
     def get_location_of_block_from_mouse(self):
         x, y = self.parent.get_mouse_pos()
@@ -495,50 +305,87 @@ class Block:
     
 
     def grab(self):
+        """
+        Mouse handling of the block closest to the mouse, once per drawn frame. The rope is only attached here:
+        the mouse position goes to parent.grab_target, and update_world pulls the block on every physics step,
+        see pull, so the rope is equally strong at any frame rate.
+        """
         if pg.mouse.get_pressed()[0]:    
             self.parent.is_grabbing = True
             line_length = self.get_location_of_block_from_mouse()
             if line_length < 150 or self.line:
                 self.line = True
+                self.wake()
                 self.air_resistance = 0.99
-                pg.draw.line(self.parent.screen, (0, 0, 0), (self.x + self.width/2, self.y + self.height/2), self.parent.get_mouse_pos(), 2)
-                if line_length > 150:
-                    # Rope behavior based on elasticity
-                    stretch_x = (self.x + self.width / 2 - self.parent.get_mouse_pos()[0]) / line_length
-                    stretch_y = (self.y + self.height / 2 - self.parent.get_mouse_pos()[1]) / line_length
-                    force = (line_length - 150) * self.parent.rope_elasticity
-                    self.vx -= force * stretch_x
-                    self.vy -= force * stretch_y
-                    
+                self.parent.overlays.append((pg.draw.line, (0, 0, 0), (self.x + self.width/2, self.y + self.height/2), self.parent.get_mouse_pos(), 2))
+                self.parent.grab_target = (self, self.parent.get_mouse_pos())
             else:
                 self.air_resistance = 0.995
+                self.parent.grab_target = None
         else:
             self.parent.is_grabbing = False
             self.line = False
             self.air_resistance = 0.995
+            self.parent.grab_target = None
+
+    def pull(self, mouse_x, mouse_y, steps):
+        """
+        Pulls the block on the rope towards the mouse position for a physics step of `steps` 1/60 s frames.
+        """
+        line_length = math.hypot(mouse_x - self.x - self.width / 2, mouse_y - self.y - self.height / 2)
+        if line_length > 150:
+            # Rope behavior based on elasticity
+            stretch_x = (self.x + self.width / 2 - mouse_x) / line_length
+            stretch_y = (self.y + self.height / 2 - mouse_y) / line_length
+            force = (line_length - 150) * self.parent.rope_elasticity * steps
+            self.vx -= force * stretch_x
+            self.vy -= force * stretch_y
+            self.wake()
     
     
 
 import pygame as pg
 import sys
-import tkinter as tk
-from tkinter import ttk
-from threading import Thread
 
 class Game:
-    def __init__(self):
-        pg.init()
+    def __init__(self, headless=False):
+        self.headless = headless
         self.winwidth = 1200
         self.winheight = 700
-        self.screen = pg.display.set_mode((self.winwidth, self.winheight))
-        pg.display.set_caption("Physics")
-        self.clock = pg.time.Clock()
+        if self.headless:
+            # No window, event pump or frame cap. Advance the world with step() instead of run()
+            self.screen = None
+            self.clock = None
+        else:
+            pg.init()
+            self.screen = pg.display.set_mode((self.winwidth, self.winheight))
+            pg.display.set_caption("Physics")
+            self.clock = pg.time.Clock()
         self.done = False
         self.line = False
         self.creating = False
         self.waitforrelease = False
         self.is_grabbing = False
-        self.move_up = False
+        self.grab_target = None  # (block, mouse position) the rope pulls towards, set by Block.grab
+
+        # Fixed timestep. The physics thread runs `substeps` physics steps of dt = FRAME_TIME / substeps per 1/60 s
+        # of real time, and the window is drawn up to fps times a second from the latest step, see PhysicsThread
+        self.fps = 60
+        self.substeps = 1
+        self.max_frame_time = 0.25  # Longest stretch of real time caught up on, so a slow step can not snowball
+        self.sim_time = 0
+
+        # Sleeping. Blocks slower than sleep_speed (plus one step of gravity, the speed a block resting on another
+        # keeps picking up) for sleep_time seconds stop being simulated until something wakes them
+        self.sleep_speed = 0.25
+        self.sleep_time = 0.5
+
+        # Contact solver, see ContactPipeline
+        self.solver_iterations = 8
+        self.baumgarte = 0.5  # Fraction of the overlap pushed out per step
+        self.slop = 0.2  # Overlap in pixels that is left alone, so resting contacts do not jitter
+        self.rest_speed = 1.0  # Slower impacts come to rest instead of bouncing
+        self.ccd_distance = 10  # Blocks moving further than this many pixels in a step get swept collision detection
 
         # Simulation parameters
         self.rope_elasticity = 0.1
@@ -547,93 +394,233 @@ class Game:
         self.air_resistance = 0.995
         self.elasticity = 0.8
         self.rigidness = 0.5
+        self.constraint_iterations = 1  # Relaxation rounds of the Fancy_Block distance constraints per step
 
-        self.players = [Block(375, 0, 50, 50, self, self.elasticity)]
+        self.world = World()
+        self.players = BodyList(self.world, [Block(375, 0, 50, 50, self, self.elasticity)])
         self.fancy_players = []
+        self.meshes = []  # MassSpringMesh soft bodies, their particles are not in the World
+        self.contacts = ContactPipeline()
+        self.constraints = DistanceConstraints()
+        self.sweep_and_prune = SweepAndPrune()
+        self.surface_cache = SurfaceCache()
+        self.renderer = DirtyRectRenderer()
+        self.frame_views = FrameViews(self.surface_cache)
+        self.frames = FrameBuffer()  # Published by the physics thread, drawn by run()
+        self.physics = None  # PhysicsThread while run() runs
+        self.lock = Lock()  # Held by every physics step of the physics thread and by anything else changing the world
+        self.index = None  # GridIndex for spatial queries, see spatial_index()
+        self.index_key = None
+        self.fancy_index = None  # GridIndex over the Fancy_Blocks, see fancy_spatial_index()
+        self.fancy_index_key = None
+        self.fancy_rows = None
+        self.overlays = []  # Things drawn on top of the blocks this frame, see DirtyRectRenderer.render
+        self.profiler = FrameProfiler()  # One frame per physics step. F3 toggles its overlay, F4 dumps it to CSV
+        self.render_profiler = FrameProfiler()  # One frame per drawn frame of run()
+        self.recorder = None  # ReplayRecorder while F6 recording is on
+        self.settings_panel = SettingsPanel()  # ESC opens it
+        self.trajectory = None  # TrajectorySink getting the state after every physics step, F7 toggles it
+
+    def save_snapshot(self, path):
+        """
+        Writes every block and Fancy_Block to a binary snapshot file, see snapshot.py. Meshes are not saved.
+        """
+        world = self.world
+        n = world.count
+        bodies = np.zeros(n, dtype=BODY)
+        for name in BODY.names:
+            if name in World.COLUMNS:
+                bodies[name] = getattr(world, name)[:n]
+        bodies["angular_velocity"] = [block.angular_velocity for block in world.blocks]
+        bodies["color"] = [block.color for block in world.blocks]
+        bodies["fancy_block"] = -1
+
+        fancy_blocks = np.zeros(len(self.fancy_players), dtype=FANCY_BLOCK)
+        for number, fancy_block in enumerate(self.fancy_players):
+            fancy_blocks[number] = (fancy_block.corner_rows(), fancy_block.width, fancy_block.height, fancy_block.rigidness, fancy_block.angle, fancy_block.angular_velocity)
+        bodies["fancy_block"][fancy_blocks["corners"].ravel()] = np.repeat(np.arange(len(fancy_blocks)), 4)
+
+        # Cached contacts are keyed by body id, which a loaded world hands out anew, so they are saved by record.
+        # Entries of bodies that are gone are left out
+        cache = self.contacts.cache
+        contacts = np.zeros(0, dtype=CONTACT)
+        if n and len(cache):
+            by_id = np.argsort(world.body_id[:n])
+            sorted_ids = world.body_id[:n][by_id]
+            first, second = cache.keys >> 32, cache.keys & 0xFFFFFFFF
+            first_at = np.minimum(np.searchsorted(sorted_ids, first), n - 1)
+            second_at = np.minimum(np.searchsorted(sorted_ids, second), n - 1)
+            boundary = first < 0  # The floor and walls keep their negative ids
+            kept = (boundary | (sorted_ids[first_at] == first)) & (sorted_ids[second_at] == second)
+            contacts = np.zeros(int(kept.sum()), dtype=CONTACT)
+            contacts["bodies"] = np.stack((np.where(boundary, first, by_id[first_at])[kept], by_id[second_at][kept]), axis=1)
+            contacts["side"], contacts["impulse"], contacts["age"] = cache.side[kept], cache.impulse[kept], cache.age[kept]
+        write_snapshot(path, bodies, fancy_blocks, contacts, self.winwidth, self.winheight, self.sim_time)
+
+    def load_snapshot(self, path):
+        """
+        Replaces every block, Fancy_Block and mesh with the contents of a snapshot file. The records are memory
+        mapped and copied into the World a column at a time, so no block goes through Block.__init__.
+        """
+        header, bodies, fancy_blocks, contacts = read_snapshot(path)
+        self.world = world = World(capacity=max(64, len(bodies)))
+        rows = world.allocate_many(len(bodies))
+        for name in BODY.names:
+            if name in World.COLUMNS:
+                getattr(world, name)[rows] = bodies[name]
+        world.store_previous()
+        blocks = [
+            Block.from_row(self, index, tuple(color), angular_velocity)
+            for index, color, angular_velocity in zip(rows.tolist(), bodies["color"].tolist(), bodies["angular_velocity"].tolist())
+        ]
+        world.set_blocks(rows, blocks)
+        self.players = BodyList(world, blocks)
 
-    def Seperating_Axis_Theorem(self):
-        for idx, player in enumerate(self.fancy_players):
-            if idx == 0:
-                color = (255, 0, 0)
-            else:
-                color = (0, 255, 0)
-            for side in ["N", "E", "S", "W"]:
-                if side == "N":
-                    axis = (0, -1)
-                    player.project(axis, color)
-                elif side == "E":
-                    axis = (1, 0)
-                    player.project(axis, color)
-                elif side == "S":
-                    axis = (0, 1)
-                    player.project(axis, color)
-                elif side == "W":
-                    axis = (-1, 0)
-                    player.project(axis, color)
-        
-    
-    
-    
-    
-    def open_settings_window(self):
-        """
-        Opens the settings window using tkinter.
-        """
-        def update_parameter(param_name, value, entry : tk.Entry):
-            """
-            Updates the game parameter with the slider/input value.
-            """
-            setattr(self, param_name, float(value))
-            entry.insert(0, str(round(getattr(self, param_name), ndigits=3)))
-
-        def create_slider(parent, label, param_name, from_, to_, resolution):
-            """
-            Creates a labeled slider for adjusting a parameter.
-            """
-            frame = tk.Frame(parent)
-            frame.pack(fill="x", pady=5)
-
-            entry = tk.Entry(frame, width=8)
-            tk.Label(frame, text=label, width=20, anchor="w").pack(side="left", padx=5)
-            slider = ttk.Scale(
-                frame,
-                from_=from_,
-                to=to_,
-                orient="horizontal",
-                length=200,
-                command=lambda value, name=param_name: update_parameter(name, value, entry),
+        # Fancy_Blocks are rebuilt around their corners and get their constraints in one go
+        self.fancy_players = []
+        self.constraints = DistanceConstraints(self.constraints.iterations)
+        for record in fancy_blocks:
+            nw, ne, se, sw = (blocks[corner] for corner in record["corners"].tolist())
+            fancy_block = Fancy_Block.from_corners(self, nw, ne, se, sw, float(record["width"]), float(record["height"]), float(record["rigidness"]))
+            fancy_block.angle = float(record["angle"])
+            fancy_block.angular_velocity = float(record["angular_velocity"])
+            self.fancy_players.append(fancy_block)
+        if len(fancy_blocks):
+            ids = world.body_id[fancy_blocks["corners"]]
+            nw, ne, se, sw = ids.T
+            diagonal = np.hypot(fancy_blocks["width"], fancy_blocks["height"])
+            width, height = fancy_blocks["width"], fancy_blocks["height"]
+            self.constraints.add(
+                np.concatenate((nw, nw, ne, sw, nw, ne)),
+                np.concatenate((ne, sw, se, se, se, sw)),
+                np.concatenate((width, height, height, width, diagonal, diagonal)),
             )
-            slider.set(getattr(self, param_name))
-            slider.pack(side="left", padx=5)
-
-            entry.insert(0, str(round(getattr(self, param_name), ndigits=3)))
-            entry.pack(side="left", padx=5)
-
-            def update_from_entry(event):
-                try:
-                    value = float(entry.get())
-                    if value > to_:
-                        slider.set(to_)
-                    update_parameter(param_name, value, entry)
-                except ValueError:
-                    entry.delete(0, tk.END)
-                    entry.insert(0, str(round(getattr(self, param_name), ndigits=3)))
-
-            entry.bind("<Return>", update_from_entry)
-
-        # Create the tkinter window
-        settings_window = tk.Tk()
-        settings_window.title("Game Settings")
-
-        # Add sliders for each parameter
-        create_slider(settings_window, "Rope Elasticity", "rope_elasticity", 0, 1, 0.01)
-        create_slider(settings_window, "Gravity", "gravity", 0, 2, 0.01)
-        create_slider(settings_window, "Friction", "friction", 0, 1, 0.01)
-        create_slider(settings_window, "Air Resistance", "air_resistance", 0, 1, 0.001)
-        create_slider(settings_window, "Elasticity", "elasticity", 0, 1, 0.01)
-        create_slider(settings_window, "Rigidness", "rigidness", 0, 1, 0.01)
-
-        settings_window.mainloop()
+
+        # Cached contacts get the pairs' new body ids. The side is seen from the body with the lower id, which may
+        # now be the other one of the pair
+        ids = world.body_id[rows]
+        first, second = contacts["bodies"][:, 0], contacts["bodies"][:, 1]
+        boundary = first < 0
+        first = np.where(boundary, first, ids[np.maximum(first, 0)])
+        second = ids[second]
+        swapped = ~boundary & (first > second)
+        self.contacts.cache.restore(
+            (np.where(swapped, second, first) << 32) | np.where(swapped, first, second),
+            np.where(swapped, contacts["side"] ^ 1, contacts["side"]), contacts["impulse"], contacts["age"],
+        )
+
+        self.meshes = []
+        self.renderer.invalidate()
+        self.sim_time = float(header["sim_time"])
+
+    def start_recording(self, path):
+        """
+        Starts recording every frame to a replay file, see replay.py.
+        """
+        self.stop_recording()
+        self.recorder = ReplayRecorder(path, self.winwidth, self.winheight)
+
+    def stop_recording(self, wait=True):
+        """
+        Stops recording. Without wait the queued frames are written and the file closed in the background, so a
+        caller holding the lock does not hold up the physics thread while they go to disk.
+        """
+        if self.recorder is not None:
+            self.recorder.close(wait)
+            self.recorder = None
+
+    def record_frame(self):
+        if self.recorder is not None:
+            with self.profiler.phase("record"):
+                self.recorder.record(self.world, self.fancy_players, self.sim_time)
+            self.profiler.count("replay_frames_written", self.recorder.frames_written)
+            self.profiler.count("replay_frames_dropped", self.recorder.frames_dropped)
+            self.profiler.count("replay_bytes_written", self.recorder.bytes_written)
+
+    def start_trajectory(self, directory, chunk_steps=1024):
+        """
+        Starts appending every body's x, y, vx, vy and angle after every physics step to memory-mapped column
+        files in directory, see trajectory.py.
+        """
+        self.stop_trajectory()
+        self.trajectory = TrajectorySink(directory, chunk_steps)
+
+    def stop_trajectory(self):
+        if self.trajectory is not None:
+            self.trajectory.close()
+            self.trajectory = None
+
+    def spatial_index(self):
+        """
+        Returns a GridIndex over the boxes of every World row, its box numbers are rows. Built in one vectorized
+        pass the first time it is needed after rows were allocated or freed, and shared by every query until then.
+        Rows that moved since the last query are moved in it (GridIndex.update), so a settling pile does not
+        sort every row again for each query.
+        """
+        world = self.world
+        key = (world, world.version)
+        n = world.count
+        x, y = world.x[:n], world.y[:n]
+        if self.index is None or self.index_key != key:
+            self.index = GridIndex(x, y, x + world.width[:n], y + world.height[:n], self.contacts.cell_size)
+            self.index_key = key
+        else:
+            self.index.update(x, y, x + world.width[:n], y + world.height[:n])
+        return self.index
+
+    def blocks_at(self, x, y):
+        """
+        Returns the blocks containing the point.
+        """
+        return [self.world.blocks[row] for row in self.spatial_index().point(x, y).tolist()]
+
+    def blocks_in(self, x0, y0, x1, y1):
+        """
+        Returns the blocks overlapping the region from (x0, y0) to (x1, y1).
+        """
+        return [self.world.blocks[row] for row in self.spatial_index().region(x0, y0, x1, y1).tolist()]
+
+    def nearest_blocks(self, x, y, k=1, max_distance=np.inf):
+        """
+        Returns up to k blocks, Fancy_Block corners included, whose centers are closest to the point, closest first.
+        """
+        rows, distances = self.spatial_index().nearest(x, y, k, max_distance)
+        return [self.world.blocks[row] for row in rows.tolist()]
+
+    def raycast(self, x, y, dx, dy, max_distance=np.inf):
+        """
+        Returns the first block hit by the ray from (x, y) in direction (dx, dy) and the distance to it, or (None, inf).
+        """
+        row, distance = self.spatial_index().raycast(x, y, dx, dy, max_distance)
+        return (None if row is None else self.world.blocks[row]), distance
+
+    def fancy_spatial_index(self):
+        """
+        Returns a GridIndex over the bounding boxes of the Fancy_Blocks, its box numbers are positions in
+        fancy_players. Kept like spatial_index: built again after rows were allocated or freed, which adding or
+        deleting a Fancy_Block does, and otherwise updated to where the corners moved.
+        """
+        world = self.world
+        key = (world, world.version, len(self.fancy_players))
+        stale = self.fancy_index is None or self.fancy_index_key != key
+        if stale:
+            self.fancy_rows = np.array([fancy_block.corner_rows() for fancy_block in self.fancy_players]).reshape(-1, 4)
+        xs, ys = world.x[self.fancy_rows], world.y[self.fancy_rows]
+        bounds = (xs.min(axis=1), ys.min(axis=1), xs.max(axis=1), ys.max(axis=1))
+        if stale:
+            self.fancy_index = GridIndex(*bounds, self.contacts.cell_size)
+            self.fancy_index_key = key
+        else:
+            self.fancy_index.update(*bounds)
+        return self.fancy_index
+
+    def fancy_blocks_at(self, x, y):
+        """
+        Returns the Fancy_Blocks whose bounding box contains the point.
+        """
+        if not self.fancy_players:
+            return []
+        return [self.fancy_players[number] for number in self.fancy_spatial_index().point(x, y).tolist()]
 
     def get_mouse_pos(self):
         x, y = pg.mouse.get_pos()
@@ -651,23 +638,27 @@ class Game:
                 self.start_position = self.get_mouse_pos()
 
                 # Delete block if mouse on block
-                for player in self.players:
-                    if player.x < self.start_position[0] < player.x + player.width and player.y < self.start_position[1] < player.y + player.height:
-                        self.players.remove(player)
-                        self.waitforrelease = True
-                        return
-                for player in self.fancy_players:
-                    if player.x < self.start_position[0] < player.x + player.width and player.y < self.start_position[1] < player.y + player.height:
-                        self.fancy_players.remove(player)
-                        self.waitforrelease = True
-                        return
+                blocks = self.blocks_at(*self.start_position)
+                if blocks:
+                    self.players.remove(blocks[0])
+                    self.waitforrelease = True
+                    return
+                fancy_blocks = self.fancy_blocks_at(*self.start_position)
+                if fancy_blocks:
+                    fancy_block = fancy_blocks[0]
+                    self.fancy_players.remove(fancy_block)
+                    self.constraints.remove_bodies(fancy_block.corner_ids())
+                    for corner in (fancy_block.nw, fancy_block.ne, fancy_block.se, fancy_block.sw):
+                        self.players.remove(corner)
+                    self.waitforrelease = True
+                    return
 
                 self.creating = True
             # Draw block when right mouse button is released
 
             elif pg.mouse.get_pressed()[2] == True and self.creating == True:
                 self.end_position = self.get_mouse_pos()
-                pg.draw.rect(self.screen, (0, 255, 255), (min(self.start_position[0], self.end_position[0]), min(self.start_position[1], self.end_position[1]), abs(self.end_position[0] - self.start_position[0]), abs(self.end_position[1] - self.start_position[1])))
+                self.overlays.append((pg.draw.rect, (0, 255, 255), (min(self.start_position[0], self.end_position[0]), min(self.start_position[1], self.end_position[1]), abs(self.end_position[0] - self.start_position[0]), abs(self.end_position[1] - self.start_position[1]))))
             elif pg.mouse.get_pressed()[2] == False and self.creating == True:
                 number = len(self.players)
                 if abs(self.end_position[0] - self.start_position[0]) == 0 or abs(self.end_position[1] - self.start_position[1]) == 0:
@@ -679,51 +670,211 @@ class Game:
                     self.players.append(Block(min(self.start_position[0], self.end_position[0]), min(self.start_position[1], self.end_position[1]), abs(self.end_position[0] - self.start_position[0]), abs(self.end_position[1] - self.start_position[1]), self, self.elasticity, number))
                 self.creating = False
     
-    def run(self):
-        def run_settings_thread():
-            """
-            Runs the tkinter settings window in a separate thread.
-            """
-            Thread(target=self.open_settings_window, daemon=True).start()
+    @property
+    def dt(self):
+        """
+        Length of one physics step in seconds.
+        """
+        return FRAME_TIME / self.substeps
 
-        while not self.done:
-            for event in pg.event.get():
-                if event.type == pg.QUIT:
-                    self.done = True
-                elif event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
-                    run_settings_thread()
-
-            self.screen.fill((255, 255, 255))
-
-            self.create_delete_block()
-            
-            # Fixes block overlap slightly. Better option would be to implement a more robust collision resolution system
-            if self.move_up == True:
-                for player in self.players:
-                    player.y -= 0.01
-                self.move_up = False
-            
-            
-            block_distances = self.winwidth + self.winheight
-            if self.is_grabbing == False:
-                closest_block = None
-                for player in self.players:
-                    if block_distances > player.get_location_of_block_from_mouse():
-                        block_distances = player.get_location_of_block_from_mouse()
-                        closest_block = player
-            
-            for player in self.players:
-                player.update()
-                player.draw(self.screen)
-                if closest_block == player:
-                    player.grab()
-            for player in self.fancy_players:
-                player.draw(self.screen)
-
-
-            pg.display.flip()
-            self.clock.tick(60)
+    def update_world(self):
+        """
+        Advances every block and fancy block by one physics step of dt seconds. Nothing is drawn.
+        """
+        world = self.world
+        profiler = self.profiler
+        steps = self.dt / FRAME_TIME
+        sleep_speed = self.sleep_speed + self.gravity * steps
+        world.store_previous()
+
+        with profiler.phase("integrate"):
+            world.apply_gravity(steps, self.gravity)
+            if self.grab_target is not None:
+                block, (mouse_x, mouse_y) = self.grab_target
+                # Blocks in the world are exactly the blocks in players
+                if block.world is world:
+                    block.pull(mouse_x, mouse_y, steps)
+
+        # Every contact between blocks and with the floor and walls solved at once, velocities only
+        contacts = self.contacts
+        contacts.iterations = int(self.solver_iterations)
+        contacts.baumgarte = self.baumgarte
+        contacts.slop = self.slop
+        contacts.rest_speed = self.rest_speed
+        contacts.ccd_distance = self.ccd_distance
+        with profiler.phase("contacts"):
+            supported = contacts.resolve(world, steps, self.winwidth, self.winheight, wake_speed=sleep_speed, gravity=self.gravity)
+        profiler.count("pairs_tested", contacts.pairs_tested, add=True)
+        profiler.count("contacts_found", contacts.contacts_found, add=True)
+        profiler.count("contacts_persisted", contacts.contacts_persisted, add=True)
+        profiler.count("contacts_swept", contacts.contacts_swept, add=True)
+        profiler.count("contacts_late", contacts.contacts_late, add=True)
+        profiler.count("contacts_occluded", contacts.contacts_occluded, add=True)
+
+        # Moving, air resistance, friction and floor/ceiling/wall handling for every block in one vectorized pass
+        with profiler.phase("integrate"):
+            world.integrate(supported, steps, self.air_resistance, self.friction, self.winwidth, self.winheight, self.rest_speed)
+        with profiler.phase("sleep"):
+            world.update_sleep(self.dt, sleep_speed, self.sleep_time)
+
+        with profiler.phase("fancy_broadphase"):
+            # Each overlapping pair of fancy blocks goes through SAT exactly once, all pairs in one batch
+            pairs = self.sweep_and_prune.update(self.fancy_players)
+        profiler.count("fancy_pairs", len(pairs), add=True)
+        if pairs:
+            with profiler.phase("sat"):
+                rows = np.array([block1.corner_rows() + block2.corner_rows() for block1, block2 in pairs])
+                corners = np.stack((world.x[rows], world.y[rows]), axis=-1)
+                colliding, normals, depths, points = sat_collide(corners[:, :4], corners[:, 4:])
+                for k in np.flatnonzero(colliding):
+                    block1, block2 = pairs[k]
+                    block1.handle_collision_response(tuple(points[k]), tuple(normals[k]), block2, depths[k])
+        if self.fancy_players:
+            with profiler.phase("fancy_constraints"):
+                self.constraints.iterations = int(self.constraint_iterations)
+                self.constraints.solve(world, self.rigidness)
+        for player in self.fancy_players:
+            player.update()
+        if self.meshes:
+            with profiler.phase("meshes"):
+                for mesh in self.meshes:
+                    mesh.update(self, steps)
+            profiler.count("particles", sum(len(mesh) for mesh in self.meshes))
+
+        profiler.count("physics_steps", 1, add=True)
+        profiler.count("bodies", world.count)
+        profiler.count("bodies_awake", int(world.count - world.asleep[:world.count].sum()))
+        self.sim_time += self.dt
+        if self.trajectory is not None:
+            with profiler.phase("trajectory"):
+                self.trajectory.append(world, self.sim_time)
+
+    def step(self, n=1):
+        """
+        Advances the simulation n physics steps as fast as possible, without drawing, polling events or capping the frame rate.
+        """
+        for _ in range(n):
+            self.update_world()
+            self.record_frame()
+            self.profiler.end_frame()
 
+    def apply_settings(self):
+        """
+        Applies the changes the settings panel sent since the last frame, all at once.
+        """
+        changes = self.settings_panel.poll()
+        for param_name, value in changes.items():
+            setattr(self, param_name, value)
+        if changes:
+            # Sleeping blocks would not notice the new values
+            self.world.wake()
+
+    def run(self):
+        if self.headless:
+            raise RuntimeError("Game.run() needs a window, use step() on headless games")
+
+        # The physics runs on the physics thread from here on, this loop handles input and draws
+        profiler = self.render_profiler
+        self.frames.publish(self)
+        self.physics = PhysicsThread(self, self.frames)
+        self.physics.start()
+        while not self.done:
+            if self.physics.error is not None:
+                raise self.physics.error
+            # Input changes the world, so it is handled between two physics steps
+            with profiler.phase("physics_lock"):
+                self.lock.acquire()
+            try:
+                with profiler.phase("events"):
+                    for event in pg.event.get():
+                        if event.type == pg.QUIT:
+                            self.done = True
+                        elif event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
+                            self.settings_panel.open(self)
+                        elif event.type == pg.KEYDOWN and event.key == pg.K_r:
+                            x, y = self.get_mouse_pos()
+                            self.meshes.append(MassSpringMesh.rope(x, y, x + 200, y, 40))
+                        elif event.type == pg.KEYDOWN and event.key == pg.K_c:
+                            x, y = self.get_mouse_pos()
+                            self.meshes.append(MassSpringMesh.cloth(x, y, 30, 20, 8))
+                        elif event.type == pg.KEYDOWN and event.key == pg.K_F5:
+                            self.save_snapshot("snapshot.bin")
+                            console.print(f"Saved {self.world.count} bodies to snapshot.bin")
+                        elif event.type == pg.KEYDOWN and event.key == pg.K_F9 and os.path.exists("snapshot.bin"):
+                            self.load_snapshot("snapshot.bin")
+                            console.print(f"Loaded {self.world.count} bodies from snapshot.bin")
+                        elif event.type == pg.KEYDOWN and event.key == pg.K_F6:
+                            if self.recorder is None:
+                                path = f"replay_{profiler.frame_no}.rpl"
+                                self.start_recording(path)
+                                console.print(f"Recording to {path}")
+                            else:
+                                # The lock is held here, the queued frames are written in the background
+                                recorder = self.recorder
+                                self.stop_recording(wait=False)
+                                console.print(f"Recorded {recorder.frame_no} frames ({recorder.frames_dropped} dropped) to {recorder.path}")
+                        elif event.type == pg.KEYDOWN and event.key == pg.K_F7:
+                            if self.trajectory is None:
+                                directory = f"trajectory_{profiler.frame_no}"
+                                self.start_trajectory(directory)
+                                console.print(f"Writing trajectories to {directory}")
+                            else:
+                                sink = self.trajectory
+                                self.stop_trajectory()
+                                console.print(f"Wrote {sink.step} steps to {sink.directory}")
+                        elif event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                            profiler.show_hud = not profiler.show_hud
+                        elif event.type == pg.KEYDOWN and event.key == pg.K_F4:
+                            path = f"profile_{profiler.frame_no}.csv"
+                            self.profiler.dump_csv(path)
+                            profiler.dump_csv(path.replace(".csv", "_render.csv"))
+                            console.print(f"Wrote the last {len(self.profiler.frames)} physics steps to {path} and {len(profiler.frames)} frames to {path.replace('.csv', '_render.csv')}")
+                        elif event.type in (pg.VIDEOEXPOSE, pg.WINDOWEXPOSED):
+                            self.renderer.invalidate()
+
+                # Settings only change between steps
+                with profiler.phase("settings"):
+                    self.apply_settings()
+
+                self.overlays = []
+                with profiler.phase("create_delete_block"):
+                    self.create_delete_block()
+
+                with profiler.phase("mouse_search"):
+                    if self.is_grabbing == False:
+                        nearest = self.nearest_blocks(*self.get_mouse_pos())
+                        closest_block = nearest[0] if nearest else None
+
+                # Blocks in the world are exactly the blocks in players
+                if closest_block is not None and closest_block.world is self.world:
+                    closest_block.grab()
+            finally:
+                self.lock.release()
+
+            if profiler.show_hud:
+                self.overlays.append((self.profiler.draw_hud, (10, 10)))
+                self.overlays.append((profiler.draw_hud, (self.winwidth - 230, 10)))
+            # The latest complete physics step, drawn between its start and end by how long ago it was published.
+            # Only the regions that changed are redrawn and updated, see DirtyRectRenderer
+            with profiler.phase("render"):
+                with self.frames.latest() as frame:
+                    bodies = self.frame_views.update(frame)
+                    alpha = min((perf_counter() - frame.time) / self.dt, 1)
+                    step = frame.step
+                self.renderer.render(self.screen, bodies, alpha, self.overlays)
+            profiler.count("dirty_rect_area", self.renderer.dirty_area)
+            profiler.count("full_frames", self.renderer.full_frames)
+            profiler.count("partial_frames", self.renderer.partial_frames)
+            profiler.count("frames_overwritten", self.frames.frames_overwritten)
+            profiler.count("physics_step", step)
+            with profiler.phase("wait"):
+                self.clock.tick(self.fps)
+            profiler.end_frame()
+
+        self.physics.stop()
+        self.stop_recording()
+        self.stop_trajectory()
+        self.settings_panel.close()
         pg.quit()
         sys.exit()
 
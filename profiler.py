@@ -0,0 +1,147 @@
+import csv
+from collections import deque
+from time import perf_counter
+import pygame as pg
+
+
+class PhaseTimer:
+    """
+    Context manager adding the time spent inside it to one phase of the current frame.
+    Timers are made once per phase and reused, so timing a phase costs two perf_counter calls.
+    """
+    __slots__ = ("times", "name", "start")
+
+    def __init__(self, times, name):
+        self.times = times
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.times[self.name] = self.times.get(self.name, 0) + perf_counter() - self.start
+
+
+class NullTimer:
+    """
+    Stand-in for PhaseTimer while the profiler is disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FrameProfiler:
+    """
+    Per-frame phase timings and counters. Phases are timed with `with profiler.phase("name"):`, a phase entered
+    several times in a frame (e.g. once per physics substep) adds up. Counters are set or added to with count().
+    end_frame() stores the frame in a ring buffer of the last `capacity` frames, which can be drawn as an
+    on-screen overlay or dumped to CSV.
+    """
+    def __init__(self, capacity=600, enabled=True):
+        self.enabled = enabled
+        self.frames = deque(maxlen=capacity)  # (frame number, frame ms, phase ms dict, counters dict)
+        self.times = {}
+        self.counters = {}
+        self.timers = {}
+        self.null_timer = NullTimer()
+        self.frame_no = 0
+        self.frame_start = perf_counter()
+        self.show_hud = False
+        self.font = None
+
+    def phase(self, name):
+        if not self.enabled:
+            return self.null_timer
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = PhaseTimer(self.times, name)
+        return timer
+
+    def count(self, name, value, add=False):
+        """
+        Sets a counter of the current frame, or adds to it with add=True.
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value if add else value
+
+    def end_frame(self):
+        """
+        Stores the timings and counters of the frame that just ended and starts the next one.
+        """
+        now = perf_counter()
+        if self.enabled:
+            times = {name: seconds * 1000 for name, seconds in self.times.items()}
+            self.frames.append((self.frame_no, (now - self.frame_start) * 1000, times, self.counters))
+            self.times.clear()
+            self.counters = {}
+        self.frame_no += 1
+        self.frame_start = now
+
+    def columns(self, frames=None):
+        """
+        Returns the names of every phase and counter in the given frames, by default the whole buffer,
+        in the order they first appear.
+        """
+        phases, counters = {}, {}
+        for frame_no, frame_ms, times, frame_counters in self.frames if frames is None else frames:
+            phases.update(dict.fromkeys(times))
+            counters.update(dict.fromkeys(frame_counters))
+        return list(phases), list(counters)
+
+    def averages(self, frames=60):
+        """
+        Returns the mean frame time, mean phase times in ms and last counter values over the last frames.
+        """
+        recent = list(self.frames)[-frames:]
+        if not recent:
+            return 0, {}, {}
+        phases, counters = self.columns(recent)
+        frame_ms = sum(frame[1] for frame in recent) / len(recent)
+        times = {name: sum(frame[2].get(name, 0) for frame in recent) / len(recent) for name in phases}
+        return frame_ms, times, {name: recent[-1][3].get(name, 0) for name in counters}
+
+    def dump_csv(self, path):
+        """
+        Writes the ring buffer to a CSV file, one row per frame, phase times in ms.
+        """
+        phases, counters = self.columns()
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame", "frame_ms"] + [f"{name}_ms" for name in phases] + counters)
+            for frame_no, frame_ms, times, frame_counters in self.frames:
+                writer.writerow(
+                    [frame_no, f"{frame_ms:.4f}"]
+                    + [f"{times.get(name, 0):.4f}" for name in phases]
+                    + [frame_counters.get(name, 0) for name in counters]
+                )
+
+    def draw_hud(self, screen, position=(10, 10)):
+        """
+        Draws the averages of the last second as a text overlay and returns the rect it covers.
+        """
+        if self.font is None:
+            self.font = pg.font.Font(None, 18)
+        frame_ms, times, counters = self.averages()
+        rows = [("frame", f"{frame_ms:.2f} ms"), ("fps", f"{1000 / frame_ms if frame_ms else 0:.0f}")]
+        rows += [(name, f"{ms:.2f} ms") for name, ms in times.items()]
+        rows += [(name, str(value)) for name, value in counters.items()]
+
+        # Labels left aligned, values right aligned in a second column
+        white = (255, 255, 255)
+        rows = [(self.font.render(label, True, white), self.font.render(value, True, white)) for label, value in rows]
+        label_width = max(label.get_width() for label, value in rows)
+        value_width = max(value.get_width() for label, value in rows)
+        line_height = self.font.get_linesize()
+        background = pg.Surface((label_width + value_width + 25, line_height * len(rows) + 10), pg.SRCALPHA)
+        background.fill((0, 0, 0, 170))
+        for idx, (label, value) in enumerate(rows):
+            y = 5 + idx * line_height
+            background.blit(label, (5, y))
+            background.blit(value, (background.get_width() - 5 - value.get_width(), y))
+        return screen.blit(background, position)
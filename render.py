@@ -0,0 +1,289 @@
+import math
+from collections import OrderedDict
+import numpy as np
+import pygame as pg
+
+
+class SurfaceCache:
+    """
+    Bounded LRU cache of pre-rendered, pre-rotated block surfaces keyed by size, color and quantized angle.
+    """
+    def __init__(self, max_size=256, angle_step=1):
+        self.max_size = max_size
+        self.angle_step = angle_step  # Degrees, rotations closer than this share a surface
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, width, height, color, angle):
+        degrees = round(math.degrees(angle) / self.angle_step) * self.angle_step % 360
+        return int(width), int(height), tuple(color), degrees
+
+    def get(self, width, height, color, angle):
+        """
+        Returns the surface of a block with the given size and color rotated by angle radians.
+        """
+        key = self.key(width, height, color, angle)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = pg.Surface(key[:2], pg.SRCALPHA)
+        surface.fill(key[2])
+        surface = pg.transform.rotate(surface, key[3])
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+class DirtyRectRenderer:
+    """
+    Redraws only the parts of the screen that changed since the last frame.
+    Every body reports the rect it covers and a state describing how it looks. Bodies that moved or changed, were
+    added or removed, and last frame's overlays mark their old and new rects dirty. Each dirty rect is cleared,
+    the bodies overlapping it are redrawn clipped to it, and only the dirty rects are sent to the display.
+    When the dirty area gets larger than max_dirty_fraction of the screen, or there are more than max_dirty_rects
+    dirty rects, a full redraw and flip is cheaper.
+    """
+    def __init__(self, background=(255, 255, 255), max_dirty_fraction=0.5, max_dirty_rects=100):
+        self.background = background
+        self.max_dirty_fraction = max_dirty_fraction
+        self.max_dirty_rects = max_dirty_rects
+        self.states = {}  # body -> (rect, state) drawn last frame
+        self.overlay_rects = []  # Rects covered by last frame's overlays
+        self.full_redraw = True
+        # Counters Game.run adds to the render profiler every drawn frame, shown by the F3 overlay
+        self.full_frames = 0  # Frames drawn whole and flipped, since the start
+        self.partial_frames = 0  # Frames drawn as dirty rectangles only, since the start
+        self.dirty_area = 0  # Pixels in the dirty rectangles of the last frame
+
+    def invalidate(self):
+        """
+        Forces a full redraw next frame, e.g. after the window was exposed.
+        """
+        self.full_redraw = True
+
+    def render(self, screen, bodies, alpha=1, overlays=()):
+        """
+        Draws the bodies, in order, and then the overlays on top and updates the display.
+        Bodies need draw(screen, alpha) and get_draw_state(alpha), returning the pg.Rect they cover and a value
+        that compares equal as long as they look the same.
+        Overlays are (pg.draw function, *arguments) tuples, e.g. (pg.draw.line, color, start, end, width).
+        """
+        bodies = list(bodies)
+        states = {body: body.get_draw_state(alpha) for body in bodies}
+
+        dirty = list(self.overlay_rects)
+        for body, (rect, state) in states.items():
+            old = self.states.get(body)
+            if old is None:
+                dirty.append(rect)
+            elif old[1] != state:
+                dirty.append(old[0])
+                dirty.append(rect)
+        for body, (rect, state) in self.states.items():
+            if body not in states:
+                dirty.append(rect)
+
+        screen_rect = screen.get_rect()
+        dirty = [rect.clip(screen_rect) for rect in dirty]
+        dirty = [rect for rect in dirty if rect.width and rect.height]
+        self.dirty_area = sum(rect.width * rect.height for rect in dirty)
+
+        too_dirty = (
+            len(dirty) > self.max_dirty_rects
+            or self.dirty_area > self.max_dirty_fraction * screen_rect.width * screen_rect.height
+        )
+        if self.full_redraw or too_dirty:
+            screen.fill(self.background)
+            for body in bodies:
+                body.draw(screen, alpha)
+            self.overlay_rects = [draw(screen, *arguments) for draw, *arguments in overlays]
+            pg.display.flip()
+            self.full_redraw = False
+            self.full_frames += 1
+        else:
+            rects = [states[body][0] for body in bodies]
+            for rect in dirty:
+                screen.set_clip(rect)
+                screen.fill(self.background, rect)
+                for idx in rect.collidelistall(rects):
+                    bodies[idx].draw(screen, alpha)
+            screen.set_clip(None)
+            self.overlay_rects = [draw(screen, *arguments) for draw, *arguments in overlays]
+            pg.display.update(dirty + self.overlay_rects)
+            self.partial_frames += 1
+
+        self.states = states
+
+
+class BlockView:
+    """
+    Drawable for one block of a published Frame, for DirtyRectRenderer. Kept per body id by FrameViews.
+    """
+    __slots__ = ("views", "row")
+
+    def __init__(self, views):
+        self.views = views
+        self.row = 0
+
+    def interpolated_position(self, alpha):
+        """
+        Position between the start (alpha 0) and the end (alpha 1) of the physics step of the frame.
+        """
+        views, row = self.views, self.row
+        previous_x, previous_y = views.previous_x[row], views.previous_y[row]
+        return previous_x + (views.x[row] - previous_x) * alpha, previous_y + (views.y[row] - previous_y) * alpha
+
+    def draw(self, screen, alpha=1):
+        views, row = self.views, self.row
+        x, y = self.interpolated_position(alpha)
+        width, height, angle, color = views.width[row], views.height[row], views.angle[row], views.color[row]
+        if angle == 0:
+            # Unrotated blocks are plain rectangles, no surface needed
+            pg.draw.rect(screen, color, (x, y, width, height))
+            return
+        rotated_image = views.surface_cache.get(width, height, color, angle)
+        rotated_rect = rotated_image.get_rect(center=(x + width / 2, y + height / 2))
+        screen.blit(rotated_image, rotated_rect.topleft)
+
+    def get_draw_state(self, alpha=1):
+        """
+        Returns the rect the block covers on screen and what it looks like.
+        """
+        views, row = self.views, self.row
+        x, y = self.interpolated_position(alpha)
+        width, height, angle, color = views.width[row], views.height[row], views.angle[row], views.color[row]
+        if angle == 0:
+            rect = pg.Rect(x, y, width, height)
+        else:
+            rotated_image = views.surface_cache.get(width, height, color, angle)
+            rect = rotated_image.get_rect(center=(x + width / 2, y + height / 2))
+        return rect, (rect.topleft, angle, color)
+
+
+class FancyBlockView:
+    """
+    Drawable for one Fancy_Block of a published Frame, a polygon through its corners.
+    """
+    __slots__ = ("views", "corners")
+    color = (0, 128, 255)
+
+    def __init__(self, views):
+        self.views = views
+        self.corners = ()  # Rows of the nw, ne, se and sw corners
+
+    def points(self, alpha):
+        views = self.views
+        return tuple(
+            (views.previous_x[row] + (views.x[row] - views.previous_x[row]) * alpha, views.previous_y[row] + (views.y[row] - views.previous_y[row]) * alpha)
+            for row in self.corners
+        )
+
+    def draw(self, screen, alpha=1):
+        pg.draw.polygon(screen, self.color, self.points(alpha))
+
+    def get_draw_state(self, alpha=1):
+        """
+        Returns the rect the Fancy_Block covers on screen and the pixel corners it is drawn with.
+        """
+        corners = tuple((int(x), int(y)) for x, y in self.points(alpha))
+        xs, ys = [x for x, y in corners], [y for x, y in corners]
+        rect = pg.Rect(min(xs), min(ys), max(xs) - min(xs) + 1, max(ys) - min(ys) + 1).inflate(2, 2)
+        return rect, corners
+
+
+class MeshView:
+    """
+    Drawable for one MassSpringMesh of a published Frame, its edges as lines or, filled, a polygon through its
+    particles in order.
+    """
+    __slots__ = ("mesh", "points")
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.points = None  # POINT records of the mesh's particles, copied out of the frame
+
+    def interpolated_points(self, alpha):
+        points = self.points
+        return np.stack((
+            points["previous_x"] + (points["x"] - points["previous_x"]) * alpha,
+            points["previous_y"] + (points["y"] - points["previous_y"]) * alpha,
+        ), axis=1)
+
+    def draw(self, screen, alpha=1):
+        mesh = self.mesh
+        points = self.interpolated_points(alpha)
+        if mesh.filled:
+            pg.draw.polygon(screen, mesh.color, points.tolist())
+            return
+        for start, end in zip(points[mesh.edge_a].tolist(), points[mesh.edge_b].tolist()):
+            pg.draw.line(screen, mesh.color, start, end)
+
+    def get_draw_state(self, alpha=1):
+        """
+        Returns the rect the mesh covers on screen and its pixel positions.
+        """
+        points = self.interpolated_points(alpha).astype(np.int64)
+        (min_x, min_y), (max_x, max_y) = points.min(axis=0), points.max(axis=0)
+        rect = pg.Rect(int(min_x), int(min_y), int(max_x - min_x) + 1, int(max_y - min_y) + 1).inflate(2, 2)
+        return rect, points.tobytes()
+
+
+class FrameViews:
+    """
+    Turns a published Frame (see framebuffer.py) into drawables for DirtyRectRenderer. update() copies what it
+    needs out of the frame, so the frame can be let go of before drawing. Views are kept per block, Fancy_Block
+    and mesh from frame to frame, so the renderer can tell what changed.
+    """
+    def __init__(self, surface_cache):
+        self.surface_cache = surface_cache
+        self.blocks = {}  # Body id -> BlockView
+        self.fancy_blocks = {}  # Body id of the nw corner -> FancyBlockView
+        self.meshes = {}  # Mesh -> MeshView
+        # Columns of the current frame as lists, read by the views
+        self.previous_x = self.previous_y = self.x = self.y = []
+        self.width = self.height = self.angle = self.color = []
+
+    def update(self, frame):
+        """
+        Points the views at the given frame and returns them in drawing order: blocks, Fancy_Blocks, meshes.
+        """
+        bodies = frame.bodies[:frame.count]
+        for name in ("previous_x", "previous_y", "x", "y", "width", "height", "angle"):
+            setattr(self, name, bodies[name].tolist())
+        self.color = [tuple(color) for color in bodies["color"].tolist()]
+        ids = bodies["body_id"].tolist()
+
+        # Fancy_Block corners have no size of their own
+        blocks = {}
+        for row in np.flatnonzero((bodies["width"] > 0) & (bodies["height"] > 0)).tolist():
+            view = self.blocks.get(ids[row]) or BlockView(self)
+            view.row = row
+            blocks[ids[row]] = view
+        self.blocks = blocks
+
+        fancy_blocks = {}
+        for corners in frame.fancy_blocks.tolist():
+            view = self.fancy_blocks.get(ids[corners[0]]) or FancyBlockView(self)
+            view.corners = corners
+            fancy_blocks[ids[corners[0]]] = view
+        self.fancy_blocks = fancy_blocks
+
+        meshes = {}
+        for mesh, start, count in frame.meshes:
+            view = self.meshes.get(mesh) or MeshView(mesh)
+            view.points = frame.points[start:start + count].copy()
+            meshes[mesh] = view
+        self.meshes = meshes
+
+        return [*self.blocks.values(), *self.fancy_blocks.values(), *self.meshes.values()]
@@ -0,0 +1,262 @@
+"""
+Replay recording and playback.
+
+A recording is a file header followed by one zlib-compressed chunk per recorded frame. Positions are quantized to
+`quantum` pixels and a frame only holds the bodies that appeared, disappeared or moved by at least one quantum since
+the last recorded frame, keyed by body id. Fancy_Blocks are recorded once, as the body ids of their corners, when
+they first show up.
+
+    python replay.py recording.rpl
+    python replay.py recording.rpl --speed 4
+"""
+import os
+
+# Playback needs no audio
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import queue
+import struct
+import sys
+import zlib
+from threading import Thread
+import numpy as np
+import pygame as pg
+
+MAGIC = b"PHYSRPLY"
+VERSION = 1
+
+HEADER = np.dtype([("magic", "S8"), ("version", "<u4"), ("quantum", "<f8"), ("winwidth", "<f8"), ("winheight", "<f8")])
+FRAME = np.dtype([("frame", "<u8"), ("sim_time", "<f8"), ("added", "<u4"), ("removed", "<u4"), ("moved", "<u4"), ("fancy_blocks", "<u4")])
+ADDED = np.dtype([("id", "<i8"), ("x", "<i4"), ("y", "<i4"), ("width", "<f4"), ("height", "<f4"), ("color", "u1", (3,))])
+MOVED = np.dtype([("id", "<i8"), ("x", "<i4"), ("y", "<i4")])
+FANCY_BLOCK = np.dtype([("corners", "<i8", (4,))])  # nw, ne, se, sw
+CHUNK = struct.Struct("<I")  # Compressed length in front of every frame
+
+FANCY_COLOR = (0, 128, 255)
+
+
+class ReplayError(Exception):
+    """
+    Raised for files that are not replays, or replays of another version.
+    """
+
+
+class ReplayRecorder:
+    """
+    Records frames of a World to a replay file. record() only works out what changed, on the caller's thread.
+    Compressing and writing happen on a background writer thread fed through a queue of at most max_queue frames.
+    When the queue is full the frame is dropped instead of waiting, and the next recorded frame carries its changes.
+    """
+    def __init__(self, path, winwidth, winheight, quantum=0.25, max_queue=120, level=1):
+        self.path = path
+        self.quantum = quantum
+        self.level = level  # zlib compression level
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.frame_no = 0
+        # Last recorded state, sorted by body id
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.x = np.zeros(0, dtype=np.int32)
+        self.y = np.zeros(0, dtype=np.int32)
+        self.fancy_blocks = set()  # Body id of the nw corner of every Fancy_Block recorded so far
+        # Counters Game.record_frame adds to the physics profiler every step while recording, shown by the F3
+        # overlay. frames_dropped is also in the message F6 prints when recording stops
+        self.frames_written = 0  # Frames the writer thread has compressed and written
+        self.frames_dropped = 0  # Steps not recorded because the queue to the writer thread was full
+        self.bytes_written = 0  # Size of the file so far, header not included
+
+        header = np.zeros(1, dtype=HEADER)
+        header[0] = (MAGIC, VERSION, quantum, winwidth, winheight)
+        self.file = open(path, "wb")
+        self.file.write(header.tobytes())
+        # A daemon, so a game that crashes mid-recording can still exit. close() waits for it
+        self.writer = Thread(target=self.write_frames, name="replay writer", daemon=True)
+        self.writer.start()
+
+    def record(self, world, fancy_blocks, sim_time):
+        """
+        Queues the changes since the last recorded frame. Never blocks.
+        """
+        n = world.count
+        order = np.argsort(world.body_id[:n])
+        ids = world.body_id[:n][order]
+        x = np.round(world.x[:n][order] / self.quantum).astype(np.int32)
+        y = np.round(world.y[:n][order] / self.quantum).astype(np.int32)
+
+        if len(self.ids):
+            idx = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+            known = self.ids[idx] == ids
+            moved = known & ((self.x[idx] != x) | (self.y[idx] != y))
+        else:
+            known = moved = np.zeros(n, dtype=bool)
+        removed = self.ids[~np.isin(self.ids, ids)]
+
+        added_rows = order[~known]
+        added = np.zeros(len(added_rows), dtype=ADDED)
+        added["id"], added["x"], added["y"] = ids[~known], x[~known], y[~known]
+        added["width"] = world.width[added_rows]
+        added["height"] = world.height[added_rows]
+        added["color"] = np.array([world.blocks[row].color for row in added_rows.tolist()], dtype=np.uint8).reshape(-1, 3)
+
+        moved_records = np.zeros(int(moved.sum()), dtype=MOVED)
+        moved_records["id"], moved_records["x"], moved_records["y"] = ids[moved], x[moved], y[moved]
+
+        new_fancy = [corners for corners in (fancy_block.corner_ids() for fancy_block in fancy_blocks) if corners[0] not in self.fancy_blocks]
+        fancy_records = np.array([(corners,) for corners in new_fancy], dtype=FANCY_BLOCK)
+
+        frame = np.zeros(1, dtype=FRAME)
+        frame[0] = (self.frame_no, sim_time, len(added), len(removed), len(moved_records), len(fancy_records))
+        try:
+            self.queue.put_nowait(b"".join((frame.tobytes(), added.tobytes(), removed.astype("<i8").tobytes(), moved_records.tobytes(), fancy_records.tobytes())))
+        except queue.Full:
+            # Keep the last recorded state, so the next frame carries these changes
+            self.frames_dropped += 1
+            return
+        self.frame_no += 1
+        self.ids, self.x, self.y = ids, x, y
+        self.fancy_blocks.update(corners[0] for corners in new_fancy)
+
+    def write_frames(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            data = zlib.compress(data, self.level)
+            self.file.write(CHUNK.pack(len(data)))
+            self.file.write(data)
+            self.frames_written += 1
+            self.bytes_written += CHUNK.size + len(data)
+
+    def close(self, wait=True):
+        """
+        Writes the frames still queued and closes the file. Without wait that happens on a thread of its own and
+        close() returns at once. That thread is not a daemon, so the process still finishes the file before exiting.
+        """
+        if not wait:
+            Thread(target=self.close, name="replay close").start()
+            return
+        self.queue.put(None)
+        self.writer.join()
+        self.file.close()
+
+
+def read_frames(path):
+    """
+    Yields the header of a replay, then a dict of record arrays for every frame.
+    """
+    with open(path, "rb") as file:
+        header = np.frombuffer(file.read(HEADER.itemsize), dtype=HEADER)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ReplayError(f"{path} is not a replay")
+        if header["version"][0] != VERSION:
+            raise ReplayError(f"{path} is a version {header['version'][0]} replay, expected version {VERSION}")
+        yield header[0]
+
+        while True:
+            length = file.read(CHUNK.size)
+            if len(length) < CHUNK.size:
+                return
+            data = zlib.decompress(file.read(CHUNK.unpack(length)[0]))
+            frame = np.frombuffer(data, dtype=FRAME, count=1)[0]
+            offset = FRAME.itemsize
+            records = {"frame": int(frame["frame"]), "sim_time": float(frame["sim_time"])}
+            for name, dtype in (("added", ADDED), ("removed", np.dtype("<i8")), ("moved", MOVED), ("fancy_blocks", FANCY_BLOCK)):
+                count = int(frame[name])
+                records[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+                offset += count * dtype.itemsize
+            yield records
+
+
+class ReplayState:
+    """
+    State of every body while a replay is played back, as arrays sorted by body id.
+    """
+    def __init__(self, quantum):
+        self.quantum = quantum
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.width = np.zeros(0)
+        self.height = np.zeros(0)
+        self.color = np.zeros((0, 3), dtype=np.uint8)
+        self.fancy_blocks = np.zeros((0, 4), dtype=np.int64)
+
+    def apply(self, frame):
+        keep = ~np.isin(self.ids, frame["removed"])
+        added = frame["added"]
+        ids = np.concatenate((self.ids[keep], added["id"]))
+        order = np.argsort(ids)
+        self.ids = ids[order]
+        self.x = np.concatenate((self.x[keep], added["x"] * self.quantum))[order]
+        self.y = np.concatenate((self.y[keep], added["y"] * self.quantum))[order]
+        self.width = np.concatenate((self.width[keep], added["width"]))[order]
+        self.height = np.concatenate((self.height[keep], added["height"]))[order]
+        self.color = np.concatenate((self.color[keep], added["color"]))[order]
+
+        moved = frame["moved"]
+        idx = np.searchsorted(self.ids, moved["id"])
+        self.x[idx] = moved["x"] * self.quantum
+        self.y[idx] = moved["y"] * self.quantum
+
+        # A Fancy_Block is gone once any of its corners is
+        self.fancy_blocks = np.concatenate((self.fancy_blocks, frame["fancy_blocks"]["corners"]))
+        self.fancy_blocks = self.fancy_blocks[np.isin(self.fancy_blocks, self.ids).all(axis=1)]
+
+    def draw(self, screen):
+        for x, y, width, height, color in zip(self.x.tolist(), self.y.tolist(), self.width.tolist(), self.height.tolist(), self.color.tolist()):
+            if width and height:
+                pg.draw.rect(screen, color, (x, y, width, height))
+        if len(self.fancy_blocks):
+            idx = np.searchsorted(self.ids, self.fancy_blocks)
+            for corners in np.stack((self.x[idx], self.y[idx]), axis=-1).tolist():
+                pg.draw.polygon(screen, FANCY_COLOR, corners)
+
+
+def play(path, speed=1.0):
+    """
+    Plays a replay in a window at its recorded pace times speed, without running any physics.
+    Space pauses, ESC or closing the window quits.
+    """
+    frames = read_frames(path)
+    header = next(frames)
+    pg.init()
+    screen = pg.display.set_mode((int(header["winwidth"]), int(header["winheight"])))
+    pg.display.set_caption(f"Replay - {os.path.basename(path)}")
+    clock = pg.time.Clock()
+    state = ReplayState(float(header["quantum"]))
+
+    paused = False
+    playback_time = None  # Recorded sim time the playback has reached
+    frame = next(frames, None)
+    while frame is not None:
+        for event in pg.event.get():
+            if event.type == pg.QUIT or event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
+                frame = None
+            elif event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
+                paused = not paused
+        elapsed = clock.tick(60) / 1000
+        if paused or frame is None:
+            continue
+        playback_time = frame["sim_time"] if playback_time is None else playback_time + elapsed * speed
+        # Every frame recorded up to the playback time is applied, only the result is drawn
+        while frame is not None and frame["sim_time"] <= playback_time:
+            state.apply(frame)
+            frame = next(frames, None)
+
+        screen.fill((255, 255, 255))
+        state.draw(screen)
+        pg.display.flip()
+    pg.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plays a recording made with F6 in main.py.")
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed, 2 plays twice as fast")
+    args = parser.parse_args(argv)
+    play(args.path, args.speed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def edge_axes(corners):
+    """
+    Returns the unit normals of the four edges of each quad in a (K, 4, 2) corner array, shape (K, 4, 2),
+    and a (K, 4) mask that is False for edges of zero length, which have no direction.
+    """
+    edges = np.roll(corners, -1, axis=1) - corners
+    normals = np.stack((-edges[..., 1], edges[..., 0]), axis=-1)
+    lengths = np.hypot(normals[..., 0], normals[..., 1])
+    valid = lengths > 0
+    normals /= np.where(valid, lengths, 1)[..., None]
+    return normals, valid
+
+
+def sat_collide(corners_a, corners_b):
+    """
+    Separating Axis Theorem test for K pairs of convex quads at once.
+    corners_a and corners_b are (K, 4, 2) arrays holding the corners of each pair in nw, ne, se, sw order.
+    Returns:
+    - colliding: (K,) bool
+    - normals: (K, 2) axis of minimum overlap, pointing from a towards b
+    - depths: (K,) overlap along that axis
+    - points: (K, 2) the corner of b reaching deepest into a
+    Values for pairs that do not collide are meaningless.
+    """
+    axes_a, valid_a = edge_axes(corners_a)
+    axes_b, valid_b = edge_axes(corners_b)
+    axes = np.concatenate((axes_a, axes_b), axis=1)  # (K, 8, 2)
+    valid = np.concatenate((valid_a, valid_b), axis=1)
+
+    # Project the four corners of both quads onto all eight axes
+    projections_a = np.einsum("kad,kpd->kap", axes, corners_a)  # (K, 8, 4)
+    projections_b = np.einsum("kad,kpd->kap", axes, corners_b)
+    min_a, max_a = projections_a.min(axis=2), projections_a.max(axis=2)
+    min_b, max_b = projections_b.min(axis=2), projections_b.max(axis=2)
+    overlaps = np.minimum(max_a, max_b) - np.maximum(min_a, min_b)
+
+    # Any axis without overlap separates the pair
+    colliding = ~np.any(valid & (overlaps < 0), axis=1) & np.any(valid, axis=1)
+    overlaps = np.where(valid, overlaps, np.inf)
+    best = np.argmin(overlaps, axis=1)
+    rows = np.arange(len(best))
+    depths = overlaps[rows, best]
+    normals = axes[rows, best]
+
+    # Point the normal from a to b
+    direction = corners_b.mean(axis=1) - corners_a.mean(axis=1)
+    flip = np.einsum("kd,kd->k", normals, direction) < 0
+    normals[flip] *= -1
+
+    # Deepest corner of b, the one with the lowest projection along the normal
+    deepest = np.argmin(np.einsum("kd,kpd->kp", normals, corners_b), axis=1)
+    points = corners_b[rows, deepest]
+    return colliding, normals, depths, points
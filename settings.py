@@ -0,0 +1,128 @@
+"""
+Settings panel.
+
+The tkinter window runs in a process of its own, so it never holds the game's GIL. Every change is sent to the
+game over a queue as a (name, value) pair, and the game applies whatever arrived at the start of a frame, all at
+once, so a frame never sees half an update.
+"""
+import multiprocessing
+import queue
+
+# Label, Game attribute, slider range and resolution
+SETTINGS = (
+    ("Rope Elasticity", "rope_elasticity", 0, 1, 0.01),
+    ("Gravity", "gravity", 0, 2, 0.01),
+    ("Friction", "friction", 0, 1, 0.01),
+    ("Air Resistance", "air_resistance", 0, 1, 0.001),
+    ("Elasticity", "elasticity", 0, 1, 0.01),
+    ("Rigidness", "rigidness", 0, 1, 0.01),
+    ("Constraint Iterations", "constraint_iterations", 1, 20, 1),
+    ("Solver Iterations", "solver_iterations", 1, 30, 1),
+    ("Baumgarte", "baumgarte", 0, 1, 0.01),
+)
+
+
+def run_settings_window(values, channel):
+    """
+    Opens the settings window with the given starting values and sends every change over channel.
+    Runs in the panel process.
+    """
+    import tkinter as tk
+    from tkinter import ttk
+
+    def update_parameter(param_name, value, entry: tk.Entry):
+        """
+        Sends the slider/input value to the game.
+        """
+        values[param_name] = float(value)
+        channel.put((param_name, values[param_name]))
+        entry.delete(0, tk.END)
+        entry.insert(0, str(round(values[param_name], ndigits=3)))
+
+    def create_slider(parent, label, param_name, from_, to_, resolution):
+        """
+        Creates a labeled slider for adjusting a parameter.
+        """
+        frame = tk.Frame(parent)
+        frame.pack(fill="x", pady=5)
+
+        entry = tk.Entry(frame, width=8)
+        tk.Label(frame, text=label, width=20, anchor="w").pack(side="left", padx=5)
+        slider = ttk.Scale(
+            frame,
+            from_=from_,
+            to=to_,
+            orient="horizontal",
+            length=200,
+            command=lambda value, name=param_name: update_parameter(name, value, entry),
+        )
+        slider.set(values[param_name])
+        slider.pack(side="left", padx=5)
+
+        entry.delete(0, tk.END)
+        entry.insert(0, str(round(values[param_name], ndigits=3)))
+        entry.pack(side="left", padx=5)
+
+        def update_from_entry(event):
+            try:
+                value = float(entry.get())
+                if value > to_:
+                    slider.set(to_)
+                update_parameter(param_name, value, entry)
+            except ValueError:
+                entry.delete(0, tk.END)
+                entry.insert(0, str(round(values[param_name], ndigits=3)))
+
+        entry.bind("<Return>", update_from_entry)
+
+    settings_window = tk.Tk()
+    settings_window.title("Game Settings")
+    for label, param_name, from_, to_, resolution in SETTINGS:
+        create_slider(settings_window, label, param_name, from_, to_, resolution)
+    settings_window.mainloop()
+
+
+class SettingsPanel:
+    """
+    Game side of the settings panel: starts the panel process and collects the changes it sent.
+    The process is started with spawn, so it does not inherit the game's pygame and SDL state.
+    """
+    def __init__(self):
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.channel = None
+
+    @property
+    def is_open(self):
+        return self.process is not None and self.process.is_alive()
+
+    def open(self, game):
+        """
+        Opens the panel showing the game's current values, unless it is open already.
+        """
+        if self.is_open:
+            return
+        self.channel = self.context.Queue()
+        values = {param_name: float(getattr(game, param_name)) for label, param_name, *_ in SETTINGS}
+        self.process = self.context.Process(target=run_settings_window, args=(values, self.channel), name="settings panel", daemon=True)
+        self.process.start()
+
+    def poll(self):
+        """
+        Returns the changes that arrived since the last call, the latest value for each name. Never blocks.
+        """
+        changes = {}
+        if self.channel is None:
+            return changes
+        while True:
+            try:
+                name, value = self.channel.get_nowait()
+            except queue.Empty:
+                return changes
+            changes[name] = value
+
+    def close(self):
+        if self.is_open:
+            self.process.terminate()
+        self.process = None
+        self.channel = None
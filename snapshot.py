@@ -0,0 +1,109 @@
+"""
+Binary world snapshots.
+
+A snapshot file is a fixed-size header followed by one fixed-width record per body, in World row order, one
+record per Fancy_Block and one per cached contact. Corners point to their Fancy_Block by its record number, and
+contacts to their bodies by their record numbers. Everything is little-endian and packed, so each table is written
+with one bulk write and read back as a NumPy memory map without parsing.
+"""
+import numpy as np
+
+MAGIC = b"PHYSWRLD"
+VERSION = 2
+
+HEADER = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("bodies", "<u8"),
+    ("fancy_blocks", "<u8"),
+    ("contacts", "<u8"),
+    ("winwidth", "<f8"),
+    ("winheight", "<f8"),
+    ("sim_time", "<f8"),
+])
+
+BODY = np.dtype([
+    ("x", "<f8"),
+    ("y", "<f8"),
+    ("vx", "<f8"),
+    ("vy", "<f8"),
+    ("width", "<f8"),
+    ("height", "<f8"),
+    ("mass", "<f8"),
+    ("elasticity", "<f8"),
+    ("player_no", "<i8"),
+    ("can_sleep", "?"),
+    ("asleep", "?"),
+    ("quiet_time", "<f8"),
+    ("angle", "<f8"),
+    ("angular_velocity", "<f8"),
+    ("color", "u1", (3,)),
+    ("fancy_block", "<i8"),  # Record number of the Fancy_Block this body is a corner of, -1 for plain blocks
+])
+
+FANCY_BLOCK = np.dtype([
+    ("corners", "<i8", (4,)),  # Body records of the nw, ne, se and sw corners
+    ("width", "<f8"),
+    ("height", "<f8"),
+    ("rigidness", "<f8"),
+    ("angle", "<f8"),
+    ("angular_velocity", "<f8"),
+])
+
+# The ContactCache, so a loaded world warm starts its contacts like the saved one would have
+CONTACT = np.dtype([
+    ("bodies", "<i8", (2,)),  # Body records of the pair, the side is seen from the first. The floor or a wall as first
+    ("side", "<i8"),
+    ("impulse", "<f8"),
+    ("age", "<i8"),
+])
+
+
+class SnapshotError(Exception):
+    """
+    Raised for files that are not snapshots, or snapshots of another version.
+    """
+
+
+def write_snapshot(path, bodies, fancy_blocks, contacts, winwidth, winheight, sim_time):
+    """
+    Writes BODY, FANCY_BLOCK and CONTACT record arrays to path.
+    """
+    header = np.zeros(1, dtype=HEADER)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["bodies"] = len(bodies)
+    header["fancy_blocks"] = len(fancy_blocks)
+    header["contacts"] = len(contacts)
+    header["winwidth"] = winwidth
+    header["winheight"] = winheight
+    header["sim_time"] = sim_time
+    with open(path, "wb") as file:
+        file.writelines((
+            header.tobytes(), np.ascontiguousarray(bodies, BODY).data, np.ascontiguousarray(fancy_blocks, FANCY_BLOCK).data,
+            np.ascontiguousarray(contacts, CONTACT).data,
+        ))
+
+
+def read_snapshot(path):
+    """
+    Memory maps a snapshot. Returns its header as a record and its body, Fancy_Block and contact records as
+    read-only memory maps, which only read from disk what is accessed.
+    """
+    header = np.fromfile(path, dtype=HEADER, count=1)
+    if len(header) == 0 or header["magic"][0] != MAGIC:
+        raise SnapshotError(f"{path} is not a world snapshot")
+    header = header[0]
+    if header["version"] != VERSION:
+        raise SnapshotError(f"{path} is a version {header['version']} snapshot, expected version {VERSION}")
+
+    def table(dtype, offset, count):
+        # np.memmap can not map zero bytes
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+    bodies = table(BODY, HEADER.itemsize, int(header["bodies"]))
+    fancy_blocks = table(FANCY_BLOCK, HEADER.itemsize + bodies.nbytes, int(header["fancy_blocks"]))
+    contacts = table(CONTACT, HEADER.itemsize + bodies.nbytes + fancy_blocks.nbytes, int(header["contacts"]))
+    return header, bodies, fancy_blocks, contacts
@@ -0,0 +1,160 @@
+import numpy as np
+from broadphase import grid_pairs
+from constraints import constraint_batches, relax
+
+
+class MassSpringMesh:
+    """
+    Soft body made of point particles held together by distance constraints along an edge list: ropes and chains,
+    cloth grids, polygons. Particles live in contiguous arrays of the mesh, not as Blocks in the World, so a mesh
+    of thousands of particles is stepped with a handful of array operations. The edges are relaxed with the same
+    solver as the Fancy_Block constraints, rest lengths are the edge lengths the mesh was built with. Long chains
+    of edges need more relaxation rounds than a Fancy_Block, so every mesh has its own `iterations`, and velocities
+    are taken from how far the relaxed particles moved so corrections never build up speed.
+    Particles collide with the floor, ceiling and walls and are pushed out of Blocks. Blocks do not feel the mesh.
+    Pinned particles have no inverse mass and stay where they are.
+    """
+    def __init__(self, x, y, edges, mass=1, pinned=(), color=(0, 0, 0), filled=False, elasticity=0.3, iterations=8):
+        self.x = np.array(x, dtype=np.float64)
+        self.y = np.array(y, dtype=np.float64)
+        self.vx = np.zeros(len(self.x))
+        self.vy = np.zeros(len(self.x))
+        self.previous_x = self.x.copy()  # Position at the start of the last physics step
+        self.previous_y = self.y.copy()
+        self.inverse_mass = np.full(len(self.x), 1 / mass)
+        self.inverse_mass[list(pinned)] = 0
+        self.elasticity = elasticity
+        self.iterations = iterations
+
+        edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+        self.edge_a, self.edge_b = edges[:, 0], edges[:, 1]
+        self.rest_length = np.hypot(self.x[self.edge_b] - self.x[self.edge_a], self.y[self.edge_b] - self.y[self.edge_a])
+        self.batches = constraint_batches(self.edge_a, self.edge_b, len(self.x))
+
+        self.color = color
+        self.filled = filled  # Drawn as a filled polygon through the particles in order instead of as its edges
+
+    def __len__(self):
+        return len(self.x)
+
+    @classmethod
+    def rope(cls, x0, y0, x1, y1, segments, pin_start=True, **kwargs):
+        """
+        Rope, or chain, of segments + 1 particles from (x0, y0) to (x1, y1), hanging from its start when pinned.
+        """
+        t = np.linspace(0, 1, segments + 1)
+        edges = np.stack((np.arange(segments), np.arange(1, segments + 1)), axis=1)
+        return cls(x0 + (x1 - x0) * t, y0 + (y1 - y0) * t, edges, pinned=[0] if pin_start else (), **kwargs)
+
+    @classmethod
+    def cloth(cls, x, y, columns, rows, spacing, pin_top=True, **kwargs):
+        """
+        Grid of columns by rows particles spacing apart with its top left at (x, y). Structural edges connect
+        neighbours, shear edges the diagonals of every cell. Pinned, the top row hangs in place.
+        """
+        index = np.arange(columns * rows).reshape(rows, columns)
+        edges = np.concatenate((
+            np.stack((index[:, :-1].ravel(), index[:, 1:].ravel()), axis=1),  # Horizontal
+            np.stack((index[:-1, :].ravel(), index[1:, :].ravel()), axis=1),  # Vertical
+            np.stack((index[:-1, :-1].ravel(), index[1:, 1:].ravel()), axis=1),  # Diagonals
+            np.stack((index[:-1, 1:].ravel(), index[1:, :-1].ravel()), axis=1),
+        ))
+        grid_y, grid_x = np.mgrid[0:rows, 0:columns]
+        pinned = index[0] if pin_top else ()
+        return cls(x + grid_x.ravel() * spacing, y + grid_y.ravel() * spacing, edges, pinned=pinned, **kwargs)
+
+    @classmethod
+    def polygon(cls, points, **kwargs):
+        """
+        Filled polygon through the given points, with an edge between every pair of them so it keeps its shape
+        like a Fancy_Block does.
+        """
+        a, b = np.triu_indices(len(points), 1)
+        x, y = np.array(points, dtype=np.float64).T
+        kwargs.setdefault("color", (0, 128, 255))
+        return cls(x, y, np.stack((a, b), axis=1), filled=True, **kwargs)
+
+    def update(self, parent, steps):
+        """
+        Advances the mesh by one physics step of `steps` 1/60 s frames with the parameters of the parent Game.
+        """
+        free = self.inverse_mass > 0
+        self.previous_x[:] = self.x
+        self.previous_y[:] = self.y
+
+        self.vy[free] += parent.gravity * steps
+        self.vx *= parent.air_resistance ** steps
+        self.vy *= parent.air_resistance ** steps
+        self.x[free] += self.vx[free] * steps
+        self.y[free] += self.vy[free] * steps
+
+        relax(
+            self.x, self.y, self.vx, self.vy, self.edge_a, self.edge_b, self.rest_length, self.batches,
+            self.iterations, 0, self.inverse_mass,
+        )
+        self.vx[free] = (self.x[free] - self.previous_x[free]) / steps
+        self.vy[free] = (self.y[free] - self.previous_y[free]) / steps
+        self.collide_blocks(parent.world, parent.contacts.cell_size)
+        self.collide_bounds(parent.winwidth, parent.winheight, parent.friction ** steps)
+
+    def collide_bounds(self, winwidth, winheight, friction):
+        """
+        Keeps the particles inside the window, bouncing them off the walls and ceiling and off the floor, where
+        they also get friction.
+        """
+        x, y, vx, vy = self.x, self.y, self.vx, self.vy
+        floor = y > winheight
+        y[floor] = winheight
+        vy[floor] *= -self.elasticity
+        vx[floor] *= friction
+        ceiling = y < 0
+        y[ceiling] = 0
+        vy[ceiling] *= -self.elasticity
+        walls = (x < 0) | (x > winwidth)
+        np.clip(x, 0, winwidth, out=x)
+        vx[walls] *= -self.elasticity
+
+    def collide_blocks(self, world, cell_size):
+        """
+        Pushes particles that ended up inside a Block out through its nearest side and stops them moving into it.
+        """
+        n = world.count
+        solid = np.flatnonzero((world.width[:n] > 0) & (world.height[:n] > 0))
+        if not len(solid):
+            return
+        count = len(self.x)
+        # Particles are points, boxes of no size sharing the grid with the blocks
+        min_x = np.concatenate((self.x, world.x[solid]))
+        min_y = np.concatenate((self.y, world.y[solid]))
+        max_x = np.concatenate((self.x, world.x[solid] + world.width[solid]))
+        max_y = np.concatenate((self.y, world.y[solid] + world.height[solid]))
+        i, j = grid_pairs(min_x, min_y, max_x, max_y, cell_size, np.arange(len(min_x)) < count)
+        # Particles come first, so i is the particle of every particle-block pair
+        block_pair = (i < count) & (j >= count)
+        particle, block = i[block_pair], solid[j[block_pair] - count]
+        px, py = self.x[particle], self.y[particle]
+        inside = (
+            (px > world.x[block]) & (px < world.x[block] + world.width[block])
+            & (py > world.y[block]) & (py < world.y[block] + world.height[block])
+            & (self.inverse_mass[particle] > 0)
+        )
+        particle, block, px, py = particle[inside], block[inside], px[inside], py[inside]
+        if not len(particle):
+            return
+
+        # Distances to the top, bottom, left and right side
+        depths = np.stack((
+            py - world.y[block],
+            world.y[block] + world.height[block] - py,
+            px - world.x[block],
+            world.x[block] + world.width[block] - px,
+        ), axis=1)
+        side = np.argmin(depths, axis=1)
+        vertical = side < 2
+        # A particle inside several blocks is pushed out of the last one
+        self.y[particle[side == 0]] = world.y[block[side == 0]]
+        self.y[particle[side == 1]] = world.y[block[side == 1]] + world.height[block[side == 1]]
+        self.x[particle[side == 2]] = world.x[block[side == 2]]
+        self.x[particle[side == 3]] = world.x[block[side == 3]] + world.width[block[side == 3]]
+        self.vy[particle[vertical]] = world.vy[block[vertical]]
+        self.vx[particle[~vertical]] = world.vx[block[~vertical]]
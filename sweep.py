@@ -0,0 +1,207 @@
+"""
+Parameter sweep runner for main.py.
+
+Runs a bench.py scenario headlessly once for every combination of a grid of Game parameters, one world per task
+spread over a process pool, and collects summary metrics of every run into one table:
+
+    python sweep.py --scenario pile --grid gravity=0.3,0.5,0.8 friction=0.6,0.8
+    python sweep.py --scenario fancy_grid --grid rigidness=0.2,0.5,0.8 --steps 1200 --output sweep.csv
+
+With --check a run in which the blocks never all fall asleep counts as failed, e.g. blocks that keep bouncing on
+the floor instead of coming to rest, and so does a run in which blocks ever overlap deeper than --max-penetration:
+
+    python sweep.py --scenario drop --check
+    python sweep.py --scenario pile --grid substeps=1,0.5 --check
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from rich.table import Table
+from bench import SCENARIOS, MainEngine, console
+from broadphase import grid_pairs
+from settings import SETTINGS
+
+# Game parameters a sweep can vary: the ones the settings window has sliders for, and the length of a step and
+# the distance from which continuous collision detection starts, which have none
+PARAMETERS = (*(name for _, name, *_ in SETTINGS), "substeps", "ccd_distance")
+METRICS = ("settle_time", "energy_gain", "max_penetration", "steps_per_second")
+
+
+class SweepEngine(MainEngine):
+    """
+    main.py with some Game parameters overridden before the scenario adds its blocks, which take the game's
+    elasticity when they are created.
+    """
+    def __init__(self, params):
+        super().__init__("main", "main.py")
+        self.params = params
+
+    def new_game(self):
+        game = super().new_game()
+        for name, value in self.params.items():
+            setattr(game, name, value)
+        return game
+
+
+def total_energy(game):
+    """
+    Kinetic plus potential energy of every block, with the floor as zero height.
+    """
+    world = game.world
+    n = world.count
+    mass, vx, vy = world.mass[:n], world.vx[:n], world.vy[:n]
+    height_above_floor = game.winheight - world.y[:n] - world.height[:n]
+    return float(np.sum(0.5 * mass * (vx**2 + vy**2) + mass * game.gravity * height_above_floor))
+
+
+def max_penetration(world):
+    """
+    Deepest overlap between two blocks that may collide, in pixels along the axis they overlap least on.
+    The scenarios spawn their blocks without overlap, so it is all penetration the solver let happen.
+    """
+    n = world.count
+    x, y, width, height = world.x[:n], world.y[:n], world.width[:n], world.height[:n]
+    i, j = grid_pairs(x, y, x + width, y + height, max(16, float(np.median(np.maximum(width, height))) if n else 16))
+    overlap_x = np.minimum(x[i] + width[i], x[j] + width[j]) - np.maximum(x[i], x[j])
+    overlap_y = np.minimum(y[i] + height[i], y[j] + height[j]) - np.maximum(y[i], y[j])
+    depth = np.minimum(overlap_x, overlap_y)[world.player_no[i] != world.player_no[j]]
+    return max(0.0, float(depth.max())) if len(depth) else 0.0
+
+
+def run_point(scenario_name, params, steps, seed):
+    """
+    Runs one scenario with one set of parameters and returns its result dict. Runs in a worker process.
+    """
+    result = {"scenario": scenario_name, **params}
+    try:
+        scenario = SCENARIOS[scenario_name](SweepEngine(params), seed)
+        game = scenario.game
+        try:
+            start_energy = last_energy = total_energy(game)
+            energy_gain = 0.0
+            deepest = 0.0
+            settle_time = None
+            duration = 0
+            for n in range(steps):
+                start = time.perf_counter()
+                scenario.step(n)
+                duration += time.perf_counter() - start
+
+                world = game.world
+                energy = total_energy(game)
+                energy_gain += max(energy - last_energy, 0.0)
+                last_energy = energy
+                deepest = max(deepest, max_penetration(world))
+                sleepers = world.can_sleep[:world.count]
+                if settle_time is None and sleepers.any() and world.asleep[:world.count][sleepers].all():
+                    settle_time = game.sim_time
+        finally:
+            scenario.close()
+
+        result["settle_time"] = settle_time  # Simulated seconds until every block that can sleep was asleep
+        # Energy the solver made up, every step's increase of the total added up, as a fraction of the starting
+        # energy. Friction and bounces only remove energy, so any increase is made up, also when a later step loses
+        # it again
+        result["energy_gain"] = energy_gain / start_energy if start_energy else 0.0
+        result["max_penetration"] = deepest  # Deepest overlap of any step, not just the last
+        result["steps_per_second"] = steps / duration
+        result["status"] = "ok"
+    except Exception as error:
+        result["status"] = "error"
+        result["error"] = f"{type(error).__name__}: {error}"
+    return result
+
+
+def parse_grid(items):
+    """
+    Turns ["gravity=0.3,0.5", "friction=0.8"] into {"gravity": [0.3, 0.5], "friction": [0.8]}.
+    """
+    grid = {}
+    for item in items:
+        name, _, values = item.partition("=")
+        if name not in PARAMETERS or not values:
+            raise argparse.ArgumentTypeError(f"expected one of {', '.join(PARAMETERS)} as name=value,value,..., got {item!r}")
+        grid[name] = [float(value) for value in values.split(",")]
+    return grid
+
+
+def grid_points(grid):
+    """
+    Every combination of the grid's values, as dicts.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def print_results(results, names):
+    table = Table(title="Parameter sweep")
+    for column in names:
+        table.add_column(column, justify="right")
+    for column in ("settle s", "energy gain", "max depth px", "steps/s"):
+        table.add_column(column, justify="right")
+    for result in results:
+        values = [f"{result[name]:g}" for name in names]
+        if result["status"] != "ok":
+            table.add_row(*values, f"[yellow]{result['status']}[/yellow]")
+            continue
+        settle_time = result["settle_time"]
+        table.add_row(
+            *values, "never" if settle_time is None else f"{settle_time:.2f}", f"{result['energy_gain']:+.2%}",
+            f"{result['max_penetration']:.2f}", f"{result['steps_per_second']:.1f}",
+        )
+    console.print(table)
+    for result in results:
+        if result["status"] != "ok":
+            console.print(f"{', '.join(f'{name}={result[name]:g}' for name in names)} {result['status']}: {result['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs a scenario on main.py for every combination of a parameter grid.")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="pile")
+    parser.add_argument("--grid", nargs="+", default=[], metavar="NAME=VALUES", help=f"Values to try, for any of {', '.join(PARAMETERS)}")
+    parser.add_argument("--steps", type=int, default=600, help="Steps per run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--output", help="Write the results table to this CSV file")
+    parser.add_argument("--check", action="store_true", help="Fail runs that never settle or let blocks sink into each other")
+    parser.add_argument(
+        "--max-penetration", type=float, default=3.0, metavar="PX", help="Deepest overlap --check lets pass, in pixels",
+    )
+    args = parser.parse_args(argv)
+    try:
+        grid = parse_grid(args.grid)
+    except argparse.ArgumentTypeError as error:
+        parser.error(str(error))
+
+    points = grid_points(grid)
+    console.print(f"Running {args.scenario} for {len(points)} parameter sets on {args.workers} workers...")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(
+            run_point, itertools.repeat(args.scenario), points, itertools.repeat(args.steps), itertools.repeat(args.seed),
+        ))
+    if args.check:
+        for result in results:
+            if result["status"] == "ok" and result["settle_time"] is None:
+                result["status"] = "unsettled"
+                result["error"] = f"not every block was asleep after {args.steps} steps"
+            elif result["status"] == "ok" and result["max_penetration"] > args.max_penetration:
+                result["status"] = "penetrating"
+                result["error"] = f"blocks overlapped {result['max_penetration']:.2f} px, more than {args.max_penetration:g} px"
+    print_results(results, list(grid))
+
+    if args.output:
+        with open(args.output, "w", newline="") as file:
+            writer = csv.DictWriter(file, ["scenario", *grid, *METRICS, "status", "error"], restval="")
+            writer.writeheader()
+            writer.writerows(results)
+        console.print(f"Results written to {args.output}")
+    return int(any(result["status"] != "ok" for result in results))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
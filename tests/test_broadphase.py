@@ -0,0 +1,103 @@
+"""
+GridIndex queries checked against testing every box, on random box sets.
+"""
+import math
+import numpy as np
+import pytest
+from broadphase import GridIndex
+
+SETS = 100
+QUERIES = 20
+
+
+def random_boxes(rng):
+    """
+    Up to 80 boxes, a fifth of them zero sized like Fancy_Block corners. Returns min_x, min_y, max_x, max_y.
+    """
+    count = int(rng.integers(0, 80))
+    min_x, min_y = rng.uniform(-300, 300, count), rng.uniform(-300, 300, count)
+    width, height = rng.uniform(0, 80, count), rng.uniform(0, 80, count)
+    points = rng.random(count) < 0.2
+    width[points] = height[points] = 0
+    return min_x, min_y, min_x + width, min_y + height
+
+
+def moved_boxes(rng, min_x, min_y, max_x, max_y):
+    """
+    The boxes with about half of them moved, most a little and some across several cells.
+    """
+    count = len(min_x)
+    moving = rng.random(count) < 0.5
+    dx = np.where(moving, rng.normal(0, 2, count) + (rng.random(count) < 0.2) * rng.uniform(-200, 200, count), 0)
+    dy = np.where(moving, rng.normal(0, 2, count) + (rng.random(count) < 0.2) * rng.uniform(-200, 200, count), 0)
+    return min_x + dx, min_y + dy, max_x + dx, max_y + dy
+
+
+def indexes(seed):
+    """
+    Yields a GridIndex over random boxes and the boxes' bounds, once built over them and once built over other
+    bounds and updated to them.
+    """
+    rng = np.random.default_rng(seed)
+    for _ in range(SETS):
+        boxes = random_boxes(rng)
+        cell_size = float(rng.uniform(10, 60))
+        yield rng, GridIndex(*boxes, cell_size), boxes
+        moved = moved_boxes(rng, *boxes)
+        index = GridIndex(*boxes, cell_size)
+        index.update(*moved)
+        yield rng, index, moved
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_point(seed):
+    for rng, index, (min_x, min_y, max_x, max_y) in indexes(seed):
+        for _ in range(QUERIES):
+            x, y = rng.uniform(-350, 350, 2)
+            inside = np.flatnonzero((min_x < x) & (x < max_x) & (min_y < y) & (y < max_y))
+            assert np.array_equal(np.sort(index.point(x, y)), inside)
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_region(seed):
+    for rng, index, (min_x, min_y, max_x, max_y) in indexes(seed):
+        for _ in range(QUERIES):
+            x0, x1 = np.sort(rng.uniform(-350, 350, 2))
+            y0, y1 = np.sort(rng.uniform(-350, 350, 2))
+            overlapping = np.flatnonzero((min_x <= x1) & (x0 <= max_x) & (min_y <= y1) & (y0 <= max_y))
+            assert np.array_equal(np.sort(index.region(x0, y0, x1, y1)), overlapping)
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_nearest(seed):
+    for rng, index, (min_x, min_y, max_x, max_y) in indexes(seed):
+        center_x, center_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+        for _ in range(QUERIES):
+            x, y = rng.uniform(-350, 350, 2)
+            k = int(rng.integers(1, 6))
+            max_distance = float(rng.choice([np.inf, rng.uniform(0, 200)]))
+            distances = np.sort(np.hypot(center_x - x, center_y - y))
+            # Ties may come in either order, so only the distances are compared
+            assert np.allclose(index.nearest(x, y, k, max_distance)[1], distances[distances <= max_distance][:k])
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_raycast(seed):
+    for rng, index, (min_x, min_y, max_x, max_y) in indexes(seed):
+        for _ in range(QUERIES):
+            x, y = rng.uniform(-350, 350, 2)
+            max_distance = float(rng.choice([np.inf, rng.uniform(0, 200)]))
+            angle = rng.uniform(0, 2 * np.pi)
+            dx, dy = float(rng.choice([np.cos(angle), 0, 1, -1])), float(rng.choice([np.sin(angle), 0, 1, -1]))
+            if dx == dy == 0:
+                dx = 1.0
+            length = math.hypot(dx, dy)
+            hit, distance = GridIndex.slab(x, y, dx / length, dy / length, min_x, min_y, max_x, max_y)
+            distance = np.where(hit, distance, np.inf)
+            nearest_hit = float(distance.min()) if len(distance) else np.inf
+            if nearest_hit > max_distance:
+                nearest_hit = np.inf
+
+            box, found = index.raycast(x, y, dx, dy, max_distance)
+            assert found == nearest_hit or np.isclose(found, nearest_hit)
+            assert box is None or np.isclose(distance[box], found)
@@ -0,0 +1,45 @@
+"""
+Contact solver checks on main.py, run headless.
+"""
+import pytest
+import main
+from sweep import max_penetration
+
+
+def new_game(substeps):
+    game = main.Game(headless=True)
+    game.players.clear()
+    game.fancy_players.clear()
+    game.meshes.clear()
+    game.substeps = substeps
+    return game
+
+
+def add_block(game, x, y, size):
+    block = main.Block(x, y, size, size, game, game.elasticity, len(game.players) + 1)
+    game.players.append(block)
+    return block
+
+
+@pytest.mark.parametrize("substeps", [1, 0.5])
+@pytest.mark.parametrize("x", [405, 452], ids=["onto", "beside"])
+@pytest.mark.parametrize("gap", [2, 30])
+def test_speculative_pair_next_to_resting_stack(substeps, x, gap):
+    """
+    Two blocks falling together, a swept pair that does not meet within a step, land onto or beside a stack of
+    three blocks resting on the floor. Neither the pair nor the stack may be pushed into each other.
+    """
+    game = new_game(substeps)
+    for level in range(3):
+        add_block(game, 400, game.winheight - 50 * (level + 1), 50)
+    for _ in range(120):
+        game.step()
+    assert game.world.asleep[:game.world.count].all()
+
+    add_block(game, x, 100, 40)
+    add_block(game, x, 140 + gap, 40)
+    deepest = 0.0
+    for _ in range(400):
+        game.step()
+        deepest = max(deepest, max_penetration(game.world))
+    assert deepest <= game.slop
@@ -0,0 +1,32 @@
+"""
+Snapshot round trips through main.py, run headless.
+"""
+import numpy as np
+import main
+
+
+def test_loaded_run_is_identical(tmp_path):
+    """
+    A world loaded from a snapshot, contact cache included, goes on exactly like the world that was saved.
+    """
+    game = main.Game(headless=True)
+    game.players.clear()
+    game.fancy_players.clear()
+    game.meshes.clear()
+    for number in range(3):
+        game.fancy_players.append(main.Fancy_Block(100 + number * 150, 100, 40, 40, game, game.elasticity, 100 + number))
+    for number in range(300):
+        game.players.append(main.Block((number * 37) % 1100, (number * 53) % 600, 20, 20, game, game.elasticity, 1000 + number))
+    game.step(40)
+
+    path = tmp_path / "snapshot.bin"
+    game.save_snapshot(path)
+    loaded = main.Game(headless=True)
+    loaded.load_snapshot(path)
+    game.step(60)
+    loaded.step(60)
+
+    n = game.world.count
+    assert loaded.world.count == n
+    for name in ("x", "y", "vx", "vy", "asleep"):
+        assert np.array_equal(getattr(loaded.world, name)[:n], getattr(game.world, name)[:n]), name
@@ -0,0 +1,132 @@
+"""
+Columnar trajectory export.
+
+A TrajectorySink appends the state of every body after every physics step to memory-mapped .npy column files,
+one file per field and chunk of chunk_steps steps. Each chunk is a (chunk_steps, width) array per field, row s
+holding step s of the chunk in World row order, with the body_id column telling which body each entry is.
+index.json lists the chunks. Rows are written field by field and the step column last, so readers, even in
+another process while the simulation is still running, only use rows whose step is set:
+
+    chunks = open_chunks("trajectories")
+    trajectories = load_trajectories("trajectories")  # {"x": (steps, bodies) array, ...}
+"""
+import json
+import os
+import numpy as np
+
+FIELDS = ("x", "y", "vx", "vy", "angle")
+
+
+class TrajectorySink:
+    """
+    Writes the FIELDS and body_id columns of a World straight from its arrays into preallocated memory-mapped
+    chunks. A new chunk is started every chunk_steps steps, or sooner when the world outgrows the chunk's width.
+    """
+    def __init__(self, directory, chunk_steps=1024):
+        self.directory = directory
+        self.chunk_steps = chunk_steps
+        self.chunks = []  # Index entries
+        self.columns = None  # Field name -> memory map of the current chunk
+        self.row = 0
+        self.step = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def open_chunk(self, world):
+        self.flush()
+        number = len(self.chunks)
+        width = world.capacity  # Room for the world to grow into before a new chunk is needed
+        self.columns = {}
+        for name, dtype, shape in (
+            *((field, world.COLUMNS[field], (self.chunk_steps, width)) for field in FIELDS),
+            ("body_id", np.int64, (self.chunk_steps, width)),
+            ("step", np.int64, (self.chunk_steps,)),
+            ("sim_time", np.float64, (self.chunk_steps,)),
+        ):
+            path = os.path.join(self.directory, f"{name}_{number:05d}.npy")
+            self.columns[name] = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        self.columns["step"][:] = -1  # Not written yet
+        self.row = 0
+        self.chunks.append({"chunk": number, "first_step": self.step, "steps": self.chunk_steps, "width": width})
+        self.write_index()
+
+    def write_index(self):
+        path = os.path.join(self.directory, "index.json")
+        with open(path + ".tmp", "w") as file:
+            json.dump({"fields": list(FIELDS), "chunks": self.chunks}, file, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def append(self, world, sim_time):
+        """
+        Appends the current state of every row of the world as the next step.
+        """
+        n = world.count
+        if self.columns is None or self.row == self.chunk_steps or n > self.columns["body_id"].shape[1]:
+            self.open_chunk(world)
+        row = self.row
+        for field in FIELDS:
+            self.columns[field][row, :n] = getattr(world, field)[:n]
+        body_id = self.columns["body_id"][row]
+        body_id[:n] = world.body_id[:n]
+        body_id[n:] = 0  # No body, real ids start at 1
+        self.columns["sim_time"][row] = sim_time
+        self.columns["step"][row] = self.step
+        self.row += 1
+        self.step += 1
+
+    def flush(self):
+        if self.columns is not None:
+            for column in self.columns.values():
+                column.flush()
+
+    def close(self):
+        self.flush()
+        self.columns = None
+
+
+def open_chunks(directory):
+    """
+    Memory maps every chunk listed in a sink's index. Returns a list of {field: array} dicts, read-only and cut
+    down to the rows written so far.
+    """
+    with open(os.path.join(directory, "index.json")) as file:
+        index = json.load(file)
+    chunks = []
+    for entry in index["chunks"]:
+        number = entry["chunk"]
+        columns = {
+            name: np.load(os.path.join(directory, f"{name}_{number:05d}.npy"), mmap_mode="r")
+            for name in (*index["fields"], "body_id", "step", "sim_time")
+        }
+        written = int(np.count_nonzero(columns["step"] >= 0))
+        chunks.append({name: column[:written] for name, column in columns.items()})
+    return chunks
+
+
+def load_trajectories(directory, body_ids=None):
+    """
+    Reads every written step into (steps, bodies) arrays per field, one column per body in body_ids, by default
+    every body that shows up, NaN for steps the body was not in the world. Also returns "body_id", "step" and
+    "sim_time".
+    """
+    chunks = open_chunks(directory)
+    if body_ids is None:
+        body_ids = np.unique(np.concatenate([chunk["body_id"].ravel() for chunk in chunks] or [np.zeros(0, dtype=np.int64)]))
+        body_ids = body_ids[body_ids > 0]
+    body_ids = np.asarray(body_ids, dtype=np.int64)
+    order = np.argsort(body_ids)
+    steps = sum(len(chunk["step"]) for chunk in chunks)
+    fields = [name for name in chunks[0] if name not in ("body_id", "step", "sim_time")] if chunks else []
+    result = {field: np.full((steps, len(body_ids)), np.nan) for field in fields}
+
+    start = 0
+    for chunk in chunks:
+        ids = np.asarray(chunk["body_id"])
+        rows, entries = np.nonzero(np.isin(ids, body_ids))
+        columns = order[np.searchsorted(body_ids, ids[rows, entries], sorter=order)]
+        for field in fields:
+            result[field][start + rows, columns] = chunk[field][rows, entries]
+        start += len(chunk["step"])
+    result["body_id"] = body_ids
+    result["step"] = np.concatenate([chunk["step"] for chunk in chunks] or [np.zeros(0, dtype=np.int64)])
+    result["sim_time"] = np.concatenate([chunk["sim_time"] for chunk in chunks] or [np.zeros(0)])
+    return result
@@ -0,0 +1,268 @@
+import itertools
+import numpy as np
+
+
+def column_property(name):
+    """
+    Makes a property that reads and writes one column of a block's row in its World.
+    """
+    def fget(self):
+        return getattr(self.world, name)[self.index]
+
+    def fset(self, value):
+        getattr(self.world, name)[self.index] = value
+
+    return property(fget, fset)
+
+
+class World:
+    """
+    Struct-of-arrays storage for the state of every Block. Each column is one contiguous NumPy array and every
+    Block is a thin view onto one row, so whole-world passes like integrate() run as array operations.
+    Rows are kept packed: rows [0, count) are in use and freeing a row moves the last row into its place.
+    """
+    COLUMNS = {
+        "x": np.float64,
+        "y": np.float64,
+        "vx": np.float64,
+        "vy": np.float64,
+        "angle": np.float64,  # Radians, drawn rotated when not 0
+        "width": np.float64,
+        "height": np.float64,
+        "mass": np.float64,
+        "elasticity": np.float64,
+        "player_no": np.int64,  # Blocks with the same player_no never collide, e.g. the corners of a Fancy_Block
+        "previous_x": np.float64,  # Position at the start of the last physics step
+        "previous_y": np.float64,
+        "can_sleep": np.bool_,
+        "asleep": np.bool_,  # Sleeping rows are not integrated and only collide with awake rows
+        "quiet_time": np.float64,  # Seconds the row has been moving slower than the sleep threshold
+        "body_id": np.int64,  # Unique per block and kept when its row moves, keys caches like the contact cache
+    }
+    body_ids = itertools.count(1)  # Shared by every World, a block keeps its id when it moves between worlds
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.capacity = capacity
+        self.version = 0  # Bumped whenever rows are allocated or freed, for caches of which row holds which body
+        for name, dtype in self.COLUMNS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.blocks = []  # Block viewing each row
+
+    def grow(self):
+        self.capacity *= 2
+        for name, dtype in self.COLUMNS.items():
+            column = np.zeros(self.capacity, dtype=dtype)
+            column[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, column)
+
+    def allocate(self, block):
+        """
+        Gives the block a zeroed row and returns its index.
+        """
+        if self.count == self.capacity:
+            self.grow()
+        index = self.count
+        for name in self.COLUMNS:
+            getattr(self, name)[index] = 0
+        self.body_id[index] = next(World.body_ids)
+        self.blocks.append(block)
+        self.count += 1
+        self.version += 1
+        return index
+
+    def allocate_many(self, count):
+        """
+        Gives count zeroed rows at once and returns their indices, for loading whole scenes. The caller fills in
+        the blocks viewing them with set_blocks().
+        """
+        while self.count + count > self.capacity:
+            self.grow()
+        rows = np.arange(self.count, self.count + count)
+        for name in self.COLUMNS:
+            getattr(self, name)[rows] = 0
+        self.body_id[rows] = np.fromiter(itertools.islice(World.body_ids, count), dtype=np.int64, count=count)
+        self.blocks.extend([None] * count)
+        self.count += count
+        self.version += 1
+        return rows
+
+    def set_blocks(self, rows, blocks):
+        """
+        Makes the blocks the views of the rows given by allocate_many().
+        """
+        for index, block in zip(rows.tolist(), blocks):
+            self.blocks[index] = block
+
+    def attach(self, block):
+        """
+        Moves a block, with its current state, into this world.
+        """
+        old_world, old_index = block.world, block.index
+        index = self.allocate(block)
+        for name in self.COLUMNS:
+            getattr(self, name)[index] = getattr(old_world, name)[old_index]
+        block.world = self
+        block.index = index
+
+    def detach(self, block):
+        """
+        Frees the block's row. The block keeps its state in a world of its own, so it stays usable on its own.
+        Sleeping blocks that were touching it are woken, they may have been resting on it.
+        """
+        index = block.index
+        self.wake_touching(self.x[index], self.y[index], self.width[index], self.height[index])
+        World(capacity=1).attach(block)
+        self.free(index)
+
+    def free(self, index):
+        last = self.count - 1
+        if index != last:
+            moved = self.blocks[last]
+            for name in self.COLUMNS:
+                column = getattr(self, name)
+                column[index] = column[last]
+            self.blocks[index] = moved
+            moved.index = index
+        self.blocks.pop()
+        self.count = last
+        self.version += 1
+
+    def apply_gravity(self, steps, gravity):
+        """
+        Accelerates every awake row for a step of `steps` 1/60 s frames, the unit gravity is given in.
+        """
+        n = self.count
+        self.vy[:n] += np.where(self.asleep[:n], 0, gravity * steps)
+
+    def integrate(self, supported, steps, air_resistance, friction, winwidth, winheight, rest_speed=0):
+        """
+        Vectorized version of the movement part of Block.update for every row at once: moving, bouncing off the
+        floor, ceiling and walls, air resistance and friction. Run after the contact solver, which already stopped
+        rows from moving into each other and into the floor and walls.
+        `steps` is the length of the step in 1/60 s frames, the unit friction and velocities are given in.
+        Rows hitting the floor slower than rest_speed come to rest on it instead of bouncing.
+        `supported` rows rest on something and get friction instead of air resistance.
+        """
+        n = self.count
+        x, y, vx, vy = self.x[:n], self.y[:n], self.vx[:n], self.vy[:n]
+        width, height, elasticity = self.width[:n], self.height[:n], self.elasticity[:n]
+        air_resistance = air_resistance ** steps
+
+        # Sleeping rows have no velocity and stay where they are
+        moving = ~self.asleep[:n]
+        y[moving] += vy[moving] * steps
+        x[moving] += vx[moving] * steps
+
+        # Floor
+        floor = moving & (y > winheight - height)
+        y[floor] = winheight - height[floor]
+        vy[floor] *= np.where(vy[floor] > rest_speed, -elasticity[floor], 0)
+        vy[moving & ~floor] *= air_resistance
+
+        # Ceiling
+        ceiling = moving & (y < 0)
+        y[ceiling] = 0
+        vy[ceiling] *= -elasticity[ceiling]
+        vy[moving & ~ceiling] *= air_resistance
+
+        # Walls
+        left = moving & (x < 0)
+        right = moving & ~left & (x > winwidth - width)
+        walls = left | right
+        vx[walls] *= -elasticity[walls]
+        x[left] = 0
+        x[right] = winwidth - width[right]
+
+        # Ground friction for rows resting on something, air resistance for the rest
+        grounded = supported | floor
+        vx[moving & grounded] *= friction ** steps
+        vx[moving & ~grounded & ~walls] *= air_resistance
+
+    def update_sleep(self, dt, sleep_speed, sleep_time):
+        """
+        Puts rows to sleep once they have been moving slower than sleep_speed for sleep_time seconds.
+        """
+        n = self.count
+        speed = np.hypot(self.vx[:n], self.vy[:n])
+        quiet = self.can_sleep[:n] & ~self.asleep[:n] & (speed < sleep_speed)
+        quiet_time = self.quiet_time[:n]
+        quiet_time[:] = np.where(quiet, quiet_time + dt, 0)
+        falling_asleep = quiet & (quiet_time >= sleep_time)
+        self.asleep[:n] |= falling_asleep
+        self.vx[:n][falling_asleep] = 0
+        self.vy[:n][falling_asleep] = 0
+
+    def wake(self, rows=slice(None)):
+        """
+        Wakes the given rows, every row by default.
+        """
+        self.asleep[:self.count][rows] = False
+        self.quiet_time[:self.count][rows] = 0
+
+    def wake_touching(self, x, y, width, height, margin=1):
+        """
+        Wakes every row whose box touches the given box grown by margin pixels.
+        """
+        n = self.count
+        self.wake(
+            (self.x[:n] <= x + width + margin) & (self.x[:n] + self.width[:n] >= x - margin)
+            & (self.y[:n] <= y + height + margin) & (self.y[:n] + self.height[:n] >= y - margin)
+        )
+
+    def store_previous(self):
+        """
+        Remembers the positions at the start of a physics step, for render interpolation.
+        """
+        n = self.count
+        self.previous_x[:n] = self.x[:n]
+        self.previous_y[:n] = self.y[:n]
+
+
+class BodyList(list):
+    """
+    List of blocks that keeps the World in sync: removing a block frees its row, adding a detached block moves it
+    back into the world.
+    """
+    def __init__(self, world, blocks=()):
+        super().__init__()
+        self.world = world
+        self.extend(blocks)
+
+    def _attach(self, block):
+        if block.world is not self.world:
+            self.world.attach(block)
+        return block
+
+    def _detach(self, block):
+        if block.world is self.world:
+            self.world.detach(block)
+
+    def append(self, block):
+        super().append(self._attach(block))
+
+    def insert(self, index, block):
+        super().insert(index, self._attach(block))
+
+    def extend(self, blocks):
+        super().extend(self._attach(block) for block in blocks)
+
+    def remove(self, block):
+        super().remove(block)
+        self._detach(block)
+
+    def pop(self, index=-1):
+        block = super().pop(index)
+        self._detach(block)
+        return block
+
+    def __delitem__(self, key):
+        blocks = self[key] if isinstance(key, slice) else [self[key]]
+        super().__delitem__(key)
+        for block in blocks:
+            self._detach(block)
+
+    def clear(self):
+        for block in self:
+            self._detach(block)
+        super().clear()